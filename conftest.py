@@ -0,0 +1 @@
+# Na raiz para que o pytest ponha esta pasta no sys.path (quimijuno_core não é um pacote instalado).
@@ -1,11 +1,27 @@
-import re
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-from PyPDF2 import PdfReader
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+import argparse
+import multiprocessing
 import os
 import sys
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+
+from quimijuno_core import (
+    BACKENDS_EXTRACAO,
+    COLUNAS_PARTICAO_PARQUET,
+    ESCRITORES_EXCEL,
+    MODOS_EXTRACAO,
+    MODOS_LOTE,
+    PERFIS_LAYOUT,
+    benchmark_escrita,
+    benchmark_extracao,
+    converter_lote,
+    converter_lote_parquet,
+    converter_pdf,
+    diagnosticar_produtos,
+    iterar_paginas_pdf_com_cache,
+    obter_cache_padrao,
+)
+
 
 class PDFToExcelConverter:
     def __init__(self, root):
@@ -54,148 +70,10 @@ class PDFToExcelConverter:
         if filename:
             self.excel_path.set(filename)
 
-    def extrair_texto_pdf(self, caminho_pdf):
-        texto = ""
-        with open(caminho_pdf, "rb") as f:
-            leitor = PdfReader(f)
-            for pagina in leitor.pages:
-                texto_extraido = pagina.extract_text()
-                if texto_extraido:  # Garantir que não adicionamos None
-                    texto += texto_extraido + "\n"
-        return texto
-
-    def extrair_dados(self, texto):
-        produtos = []
-
-        if "DESCRIÇÃO" in texto:
-            texto = texto.split("DESCRIÇÃO", 1)[1]
-        else:
-            messagebox.showwarning("Aviso", "Cabeçalho 'DESCRIÇÃO' não encontrado.")
-            return []
-
-        # Limpar espaços extra
-        linhas = [linha.strip() for linha in texto.splitlines() if linha.strip()]
-        texto = "\n".join(linhas)
-
-        padrao = re.compile(
-            r"(?P<referencia>\[[^\]]+\])\s*"
-            r"(?P<descricao>(?:(?!\[\w+\]).)*?)(?=\s*\d+[.,]\d+(?:\s*(?:[kK][gG]|[lL](?:itros?)?|UN))?)\s*"
-            r"(?P<quantidade>\d+[.,]\d+)"
-            r"(?:\s*(?P<unidade>(?:[kK][gG]|[lL](?:itros?)?|UN)))?"
-            r"\s+(?P<preco>\d+[.,]\d+)"
-            r"\s+(?P<impostos>IVA\s*\d+%?)"
-            r"\s+(?P<amount>\d+[.,]\d+\s*€)",
-            flags=re.DOTALL | re.IGNORECASE
-        )
-
-        matches = list(padrao.finditer(texto))
-
-        if not matches:
-            messagebox.showwarning("Aviso", "Nenhuma entrada de produto foi encontrada com o padrão definido.")
-
-        for match in matches:
-            dados = match.groupdict()
-
-            referencia = dados["referencia"].strip('[]')
-            descricao_completa = " ".join(dados["descricao"].split())
-            
-            descricao_principal = descricao_completa
-            descricao_secundaria = ""
-            descricao_terciaria = ""
-            
-            if " Equivalente " in descricao_completa:
-                partes_equivalente = descricao_completa.split(" Equivalente ", 1)
-                descricao_principal = partes_equivalente[0].strip()
-                parte_equivalente = " Equivalente " + partes_equivalente[1].strip()
-                
-                padrao_divisao = r'(IBC\s.*|Cisterna\s.*|Tambor\s.*|Palete\s.*|Barrica\s.*|Lata\s.*|Jerrican\s.*|TB\s.*)'
-                if re.search(padrao_divisao, parte_equivalente, re.IGNORECASE):
-                    partes_embalagem = re.split(padrao_divisao, parte_equivalente, 1, flags=re.IGNORECASE)
-                    descricao_secundaria = partes_embalagem[0].strip()
-                    descricao_terciaria = partes_embalagem[1].strip() if len(partes_embalagem) > 1 else ""
-                else:
-                    descricao_secundaria = parte_equivalente.strip()
-            else:
-                padrao_divisao = r'(IBC\s.*|Cisterna\s.*|Tambor\s.*)'
-                if re.search(padrao_divisao, descricao_completa, re.IGNORECASE):
-                    partes = re.split(padrao_divisao, descricao_completa, 1, flags=re.IGNORECASE)
-                    descricao_principal = partes[0].strip()
-                    descricao_secundaria = partes[1].strip() if len(partes) > 1 else ""
-
-            quantidade = float(dados["quantidade"].replace(',', '.'))
-
-            unidade = dados.get("unidade", "").upper()
-            if unidade.startswith('L'):
-                unidade = 'L'
-            elif unidade.startswith('K'):
-                unidade = 'KG'
-            elif unidade == 'UN':
-                unidade = 'Unidades'
-
-            preco = float(dados["preco"].replace(',', '.'))
-
-            impostos_text = dados["impostos"]
-            num_impostos = re.search(r'\d+[.,]?\d*', impostos_text)
-            impostos = float(num_impostos.group().replace(',', '.')) / 100.0 if num_impostos else 0.0
-
-            amount = float(dados["amount"].replace('€', '').replace(',', '.'))
-
-            produtos.append({
-                "REFERÊNCIA": referencia,
-                "DESCRIÇÃO": descricao_principal,
-                "DESCRIÇÃO_SECUNDARIA": descricao_secundaria,
-                "DESCRIÇÃO_TERCIARIA": descricao_terciaria,
-                "QUANTIDADE": quantidade,
-                "UNIDADE": unidade,
-                "PREÇO UNITÁRIO": preco,
-                "IMPOSTOS": impostos,
-                "AMOUNT": amount
-            })
-
-        return produtos
-
-    def escrever_excel(self, produtos, caminho_excel):
-        workbook = Workbook()
-        sheet = workbook.active
-        
-        headers = ["REFERÊNCIA", "DESCRIÇÃO", "QUANTIDADE", "UNIDADE", "PREÇO UNITÁRIO", "IMPOSTOS", "AMOUNT"]
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=1, column=col)
-            cell.value = header
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        current_row = 2
-        for produto in produtos:
-            sheet.cell(row=current_row, column=1).value = produto["REFERÊNCIA"]
-            sheet.cell(row=current_row, column=2).value = produto["DESCRIÇÃO"]
-            sheet.cell(row=current_row, column=3).value = produto["QUANTIDADE"]
-            sheet.cell(row=current_row, column=4).value = produto["UNIDADE"]
-            sheet.cell(row=current_row, column=5).value = produto["PREÇO UNITÁRIO"]
-            sheet.cell(row=current_row, column=6).value = produto["IMPOSTOS"]
-            sheet.cell(row=current_row, column=7).value = produto["AMOUNT"]
-            
-            if produto["DESCRIÇÃO_SECUNDARIA"]:
-                current_row += 1
-                sheet.cell(row=current_row, column=2).value = produto["DESCRIÇÃO_SECUNDARIA"]
-            
-            if produto["DESCRIÇÃO_TERCIARIA"]:
-                current_row += 1
-                sheet.cell(row=current_row, column=2).value = produto["DESCRIÇÃO_TERCIARIA"]
-            
-            current_row += 1
-        
-        for col in range(1, 8):
-            sheet.column_dimensions[chr(64 + col)].width = 18
-            
-        for row in range(2, current_row, 3):
-            for col in [3, 5, 6, 7]:
-                cell = sheet.cell(row=row, column=col)
-                if cell.value is not None:
-                    cell.number_format = "#,##0.00"
-        
-        workbook.save(caminho_excel)
+    def mostrar_progresso(self, percentagem, mensagem):
+        self.status_label.config(text=mensagem)
+        self.progress['value'] = percentagem
+        self.root.update_idletasks()
 
     def convert(self):
         if not self.pdf_path.get() or not self.excel_path.get():
@@ -203,27 +81,14 @@ class PDFToExcelConverter:
             return
 
         try:
-            self.status_label.config(text="A processar PDF...")
-            self.progress['value'] = 33
-            self.root.update_idletasks()
-
-            texto = self.extrair_texto_pdf(self.pdf_path.get())
-
-            self.status_label.config(text="A extrair dados...")
-            self.progress['value'] = 66
-            self.root.update_idletasks()
-
-            produtos = self.extrair_dados(texto)
-
-            if produtos:
-                self.status_label.config(text="A criar ficheiro Excel...")
-                self.progress['value'] = 90
-                self.root.update_idletasks()
-
-                self.escrever_excel(produtos, self.excel_path.get())
-
-                self.progress['value'] = 100
-                self.status_label.config(text="Conversão concluída com sucesso!")
+            resultado = converter_pdf(
+                self.pdf_path.get(),
+                self.excel_path.get(),
+                avisar=lambda mensagem: messagebox.showwarning("Aviso", mensagem),
+                progresso=self.mostrar_progresso,
+            )
+
+            if resultado["produtos"]:
                 messagebox.showinfo("Sucesso", f"Dados exportados com sucesso para {self.excel_path.get()}")
             else:
                 self.status_label.config(text="Nenhum produto encontrado.")
@@ -234,7 +99,166 @@ class PDFToExcelConverter:
             self.progress['value'] = 0
             messagebox.showerror("Erro", f"Ocorreu um erro durante a conversão:\n{str(e)}")
 
-def main():
+def imprimir_benchmark_extracao(resultados):
+    print(f"{'motor':<12}{'páginas':>9}{'páginas/s':>12}{'reconhecimento':>17}{'erros':>7}")
+    for r in sorted(resultados, key=lambda r: r["paginas_por_segundo"], reverse=True):
+        print(
+            f"{r['motor']:<12}{r['paginas']:>9}{r['paginas_por_segundo']:>12.1f}"
+            f"{r['reconhecimento']:>16.1%}{r['erros']:>7}"
+        )
+
+
+def imprimir_diagnostico(diagnostico, mais_lentos=10):
+    produtos = diagnostico["produtos"]
+    print(
+        f"Perfil: {diagnostico['perfil']}  produtos: {len(produtos)}  "
+        f"análise: {diagnostico['segundos'] * 1000:.1f} ms"
+    )
+    if not diagnostico["cabecalho_encontrado"]:
+        print("Cabeçalho da tabela não encontrado.")
+        return
+
+    print(f"\nProdutos mais lentos ({min(mais_lentos, len(produtos))}):")
+    print(f"{'ms':>9}{'página':>8}{'início':>10}{'fim':>10}  referência")
+    for p in sorted(produtos, key=lambda p: p["segundos"], reverse=True)[:mais_lentos]:
+        print(f"{p['segundos'] * 1000:>9.3f}{p['pagina'] + 1:>8}{p['inicio']:>10}{p['fim']:>10}  {p['referencia']}")
+
+    print(f"\nTexto não consumido ({len(diagnostico['nao_consumidos'])} troços):")
+    for troco in diagnostico["nao_consumidos"]:
+        print(f"{troco['pagina'] + 1:>8}{troco['inicio']:>10}{troco['fim']:>10}  {troco['texto']}")
+
+
+def _mib(valor):
+    return f"{valor / (1024 * 1024):.1f}" if valor is not None else "?"
+
+
+def imprimir_benchmark_escrita(resultados):
+    print(f"{'escritor':<12}{'produtos':>10}{'produtos/s':>12}{'pico MiB':>10}{'acréscimo MiB':>15}")
+    for r in sorted(resultados, key=lambda r: r["produtos_por_segundo"], reverse=True):
+        print(
+            f"{r['escritor']:<12}{r['produtos']:>10}{r['produtos_por_segundo']:>12.0f}"
+            f"{_mib(r['pico_memoria']):>10}{_mib(r['acrescimo_memoria']):>15}"
+        )
+
+
+def _opcoes_extracao(subcomando):
+    subcomando.add_argument(
+        "--extracao", choices=MODOS_EXTRACAO, default="fluxo",
+        help="fluxo: página a página, pouca memória; paralelo: análise repartida por processos, "
+             "com o documento em memória; posicional: pelas posições do texto nas colunas",
+    )
+    subcomando.add_argument(
+        "--apenas-tabela", action="store_true",
+        help="Lê só as páginas da tabela de produtos, sem a cache, e pára no fim da tabela",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conversor de Cotação PDF para Excel")
+    subcomandos = parser.add_subparsers(dest="comando")
+    benchmark = subcomandos.add_parser(
+        "benchmark-extracao", help="Compara os motores de extração sobre PDFs locais"
+    )
+    benchmark.add_argument("pdfs", nargs="+", help="Ficheiros PDF ou pastas com PDFs")
+    benchmark.add_argument(
+        "--motor", action="append", choices=sorted(BACKENDS_EXTRACAO),
+        help="Motor a medir (pode repetir-se); por omissão todos os instalados",
+    )
+    benchmark_xlsx = subcomandos.add_parser(
+        "benchmark-escrita", help="Compara os escritores de Excel (produtos/s e pico de memória)"
+    )
+    benchmark_xlsx.add_argument("pdfs", nargs="+", help="Ficheiros PDF ou pastas com PDFs")
+    benchmark_xlsx.add_argument(
+        "--escritor", action="append", choices=sorted(ESCRITORES_EXCEL),
+        help="Escritor a medir (pode repetir-se); por omissão todos os instalados",
+    )
+    benchmark_xlsx.add_argument(
+        "--repetir", type=int, default=1, help="Repete os produtos N vezes para simular exportações grandes"
+    )
+    diagnostico = subcomandos.add_parser(
+        "diagnostico", help="Mostra os produtos mais lentos de analisar e o texto que nenhum padrão consumiu"
+    )
+    diagnostico.add_argument("pdf", help="Ficheiro PDF da cotação")
+    diagnostico.add_argument("--perfil", choices=sorted(PERFIS_LAYOUT), help="Perfil de cotação; por omissão detetado")
+    diagnostico.add_argument("--mais-lentos", type=int, default=10, help="Quantos produtos lentos mostrar")
+    converter = subcomandos.add_parser("converter", help="Converte uma cotação em PDF para Excel")
+    converter.add_argument("pdf", help="Ficheiro PDF da cotação")
+    converter.add_argument("--saida", required=True, help="Ficheiro Excel de destino")
+    converter.add_argument("--perfil", choices=sorted(PERFIS_LAYOUT), help="Perfil de cotação; por omissão detetado")
+    _opcoes_extracao(converter)
+    lote = subcomandos.add_parser(
+        "lote", help="Junta várias cotações num só livro Excel, lidas uma a uma"
+    )
+    lote.add_argument("pdfs", nargs="+", help="Ficheiros PDF ou pastas com PDFs")
+    lote.add_argument("--saida", required=True, help="Ficheiro Excel de destino")
+    lote.add_argument(
+        "--modo", choices=MODOS_LOTE, default="folhas",
+        help="folhas: uma folha por cotação; unica: uma só folha com a coluna FICHEIRO",
+    )
+    lote.add_argument("--perfil", choices=sorted(PERFIS_LAYOUT), help="Perfil de cotação; por omissão detetado")
+    lote.add_argument(
+        "--folhas-por-livro", type=int, help="Continua noutro ficheiro quando o livro chega a N folhas"
+    )
+    _opcoes_extracao(lote)
+    lote_parquet = subcomandos.add_parser(
+        "lote-parquet", help="Exporta várias cotações para Parquet (precisa do pyarrow), lidas uma a uma"
+    )
+    lote_parquet.add_argument("pdfs", nargs="+", help="Ficheiros PDF ou pastas com PDFs")
+    lote_parquet.add_argument(
+        "--saida", required=True, help="Ficheiro Parquet de destino (uma pasta, com --particionar)"
+    )
+    lote_parquet.add_argument(
+        "--particionar", action="append", choices=COLUNAS_PARTICAO_PARQUET,
+        help="Coluna de partição hive (pode repetir-se)",
+    )
+    lote_parquet.add_argument("--fornecedor", help="Fornecedor a gravar em todas as linhas")
+    lote_parquet.add_argument(
+        "--float", action="store_true", help="Números em float64 em vez de decimal exato"
+    )
+    lote_parquet.add_argument("--perfil", choices=sorted(PERFIS_LAYOUT), help="Perfil de cotação; por omissão detetado")
+    _opcoes_extracao(lote_parquet)
+    args = parser.parse_args(argv)
+
+    if args.comando == "benchmark-extracao":
+        imprimir_benchmark_extracao(benchmark_extracao(args.pdfs, args.motor))
+        return
+    if args.comando == "benchmark-escrita":
+        imprimir_benchmark_escrita(benchmark_escrita(args.pdfs, args.escritor, args.repetir))
+        return
+    if args.comando == "diagnostico":
+        cache = obter_cache_padrao(lambda mensagem: print("Aviso:", mensagem, file=sys.stderr))
+        paginas = iterar_paginas_pdf_com_cache(args.pdf, cache)
+        imprimir_diagnostico(diagnosticar_produtos(paginas, args.perfil), args.mais_lentos)
+        return
+    if args.comando == "converter":
+        resultado = converter_pdf(
+            args.pdf, args.saida, args.perfil,
+            avisar=lambda mensagem: print("Aviso:", mensagem, file=sys.stderr),
+            modo_extracao=args.extracao, apenas_tabela=args.apenas_tabela,
+        )
+        if resultado["produtos"]:
+            print(f"{resultado['produtos']} produtos em {args.saida}")
+        else:
+            print("Nenhum produto encontrado.")
+        return
+    if args.comando == "lote":
+        resultado = converter_lote(
+            args.pdfs, args.saida, args.modo, args.perfil,
+            avisar=lambda mensagem: print("Aviso:", mensagem, file=sys.stderr),
+            folhas_por_livro=args.folhas_por_livro, modo_extracao=args.extracao, apenas_tabela=args.apenas_tabela,
+        )
+        livros = ", ".join(resultado["caminhos_excel"]) or "nenhum ficheiro"
+        print(f"{resultado['produtos']} produtos de {len(resultado['pdfs'])} PDFs em {livros}")
+        return
+    if args.comando == "lote-parquet":
+        resultado = converter_lote_parquet(
+            args.pdfs, args.saida, args.particionar, args.fornecedor, not args.float, args.perfil,
+            avisar=lambda mensagem: print("Aviso:", mensagem, file=sys.stderr),
+            modo_extracao=args.extracao, apenas_tabela=args.apenas_tabela,
+        )
+        print(f"{resultado['produtos']} produtos de {len(resultado['pdfs'])} PDFs em {resultado['destino']}")
+        return
+
     root = tk.Tk()
     
     if hasattr(sys, '_MEIPASS'):
@@ -251,4 +275,5 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Necessário para o ProcessPoolExecutor no exe do PyInstaller
     main()
@@ -0,0 +1,2885 @@
+import re
+import hashlib
+import importlib.metadata
+import importlib.util
+import io
+import mmap
+import multiprocessing
+import sqlite3
+import tempfile
+import time
+import urllib.parse
+import uuid
+import zipfile
+from PyPDF2 import PdfReader, __version__ as VERSAO_PYPDF2
+import PyPDF2._page
+from PyPDF2._cmap import build_char_map
+from PyPDF2.generic import ArrayObject, DictionaryObject, StreamObject
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
+import os
+import sys
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, islice, repeat
+from datetime import date
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+
+class _LeitorBuffer:
+    """
+    Ficheiro só de leitura sobre um buffer em memória (bytes, bytearray,
+    memoryview), sem copiar o conteúdo. Implementa apenas o que o PdfReader usa.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer).cast("B")
+        self.posicao = 0
+
+    def read(self, tamanho=-1):
+        fim = len(self.buffer) if tamanho is None or tamanho < 0 else self.posicao + tamanho
+        dados = self.buffer[self.posicao:fim].tobytes()
+        self.posicao += len(dados)
+        return dados
+
+    def seek(self, deslocamento, origem=os.SEEK_SET):
+        if origem == os.SEEK_CUR:
+            deslocamento += self.posicao
+        elif origem == os.SEEK_END:
+            deslocamento += len(self.buffer)
+        self.posicao = max(0, deslocamento)
+        return self.posicao
+
+    def tell(self):
+        return self.posicao
+
+
+def _e_buffer(fonte_pdf):
+    return isinstance(fonte_pdf, (bytes, bytearray, memoryview))
+
+
+@contextmanager
+def abrir_fonte_pdf(fonte_pdf):
+    """
+    Abre a fonte do PDF para o PdfReader. Um caminho é mapeado em memória
+    (mmap), para que as muitas leituras pequenas do PdfReader não passem por
+    chamadas ao sistema; bytes/bytearray/memoryview são lidos diretamente.
+    """
+    if _e_buffer(fonte_pdf):
+        yield _LeitorBuffer(fonte_pdf)
+        return
+
+    with open(fonte_pdf, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # O mmap não aceita ficheiros vazios; o PdfReader dará o erro adequado.
+            yield f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            yield mapa
+
+
+# Programas de fonte embutidos: não influenciam o mapa de caracteres e são grandes.
+_CHAVES_IGNORADAS_DIGEST = {"/FontFile", "/FontFile2", "/FontFile3"}
+
+
+def _atualizar_digest(sha, objeto, visitados):
+    objeto = objeto.get_object()
+    if id(objeto) in visitados:
+        return
+    if isinstance(objeto, (DictionaryObject, StreamObject)):
+        visitados.add(id(objeto))
+        for chave in sorted(objeto):
+            if chave in _CHAVES_IGNORADAS_DIGEST:
+                continue
+            sha.update(chave.encode("utf-8", "surrogatepass"))
+            _atualizar_digest(sha, objeto.raw_get(chave), visitados)
+        if isinstance(objeto, StreamObject):
+            sha.update(objeto.get_data())
+    elif isinstance(objeto, ArrayObject):
+        sha.update(b"[")
+        for elemento in objeto:
+            _atualizar_digest(sha, elemento, visitados)
+        sha.update(b"]")
+    else:
+        sha.update(repr(objeto).encode("utf-8", "surrogatepass"))
+
+
+def digest_fonte(fonte):
+    """Resumo do conteúdo de um recurso de fonte (dicionário, /ToUnicode, /Encoding, larguras)."""
+    sha = hashlib.sha1()
+    _atualizar_digest(sha, fonte, set())
+    return sha.digest()
+
+
+class CacheMapasFontes:
+    """
+    Cache LRU dos mapas de caracteres (build_char_map) do PyPDF2, partilhada
+    entre páginas e entre documentos do mesmo processo. A chave é o resumo do
+    conteúdo do recurso de fonte, por isso PDFs gerados pelo mesmo ERP com as
+    mesmas fontes embutidas reutilizam o CMap já interpretado.
+    """
+
+    def __init__(self, maximo=256):
+        self.maximo = maximo
+        self.mapas = OrderedDict()
+
+    def obter(self, nome_fonte, largura_espaco, objeto):
+        """Mesma assinatura e resultado que PyPDF2._cmap.build_char_map."""
+        fonte = objeto["/Resources"]["/Font"][nome_fonte].get_object()
+        chave = (digest_fonte(fonte), largura_espaco)
+        mapa = self.mapas.get(chave)
+        if mapa is None:
+            mapa = build_char_map(nome_fonte, largura_espaco, objeto)
+            self.mapas[chave] = mapa
+            if len(self.mapas) > self.maximo:
+                self.mapas.popitem(last=False)
+        else:
+            self.mapas.move_to_end(chave)
+        # O último elemento é o dicionário da fonte, que pertence a cada documento.
+        return mapa[:4] + (fonte,)
+
+
+CACHE_MAPAS_FONTES = CacheMapasFontes()
+
+
+# A cache substitui um nome interno do PyPDF2 3.x: o build_char_map que
+# PyPDF2._page importa de PyPDF2._cmap (verificado com o PyPDF2 3.0.1). Só
+# é instalada se esse nome ainda for a função original; se outra versão o
+# mudar, a extração continua a funcionar, apenas sem a cache.
+def instalar_cache_mapas_fontes(cache=CACHE_MAPAS_FONTES):
+    """
+    Faz o extract_text do PyPDF2 usar a cache de mapas de caracteres, uma só
+    vez por processo. Devolve True se a cache está instalada.
+    """
+    atual = getattr(PyPDF2._page, "build_char_map", None)
+    if atual == cache.obter:
+        return True
+    if atual is not build_char_map:
+        return False
+    PyPDF2._page.build_char_map = cache.obter
+    return True
+
+
+# Incrementar sempre que a forma de extrair o texto mudar, para que as
+# entradas antigas da cache deixem de ser usadas.
+VERSAO_EXTRATOR = 2
+
+
+def _versao_pacote(nome):
+    try:
+        return importlib.metadata.version(nome)
+    except importlib.metadata.PackageNotFoundError:
+        return "?"
+
+
+class BackendExtracao:
+    """
+    Motor de extração de texto. Cada subclasse implementa contar_paginas e
+    iterar_paginas para uma biblioteca; o PyPDF2 é o motor por omissão.
+    """
+
+    nome = ""
+    modulo = ""
+    pacote = ""
+
+    @classmethod
+    def disponivel(cls):
+        return importlib.util.find_spec(cls.modulo) is not None
+
+    def versao(self):
+        """Identifica a biblioteca e a versão, para as chaves da cache."""
+        return f"{self.nome}-{_versao_pacote(self.pacote)}/{VERSAO_EXTRATOR}"
+
+    def contar_paginas(self, fonte_pdf):
+        raise NotImplementedError
+
+    def iterar_paginas(self, fonte_pdf, inicio=0, fim=None):
+        """Gera pares (índice, texto) para as páginas [inicio, fim)."""
+        raise NotImplementedError
+
+
+class BackendPyPDF2(BackendExtracao):
+    nome = "pypdf2"
+    modulo = pacote = "PyPDF2"
+
+    def __init__(self):
+        instalar_cache_mapas_fontes()
+
+    def versao(self):
+        return f"{self.nome}-{VERSAO_PYPDF2}/{VERSAO_EXTRATOR}"
+
+    def contar_paginas(self, fonte_pdf):
+        with abrir_fonte_pdf(fonte_pdf) as fonte:
+            return len(PdfReader(fonte).pages)
+
+    def iterar_paginas(self, fonte_pdf, inicio=0, fim=None):
+        with abrir_fonte_pdf(fonte_pdf) as fonte:
+            paginas = PdfReader(fonte).pages
+            for indice in range(inicio, len(paginas) if fim is None else fim):
+                yield indice, paginas[indice].extract_text() or ""
+
+
+class BackendPdfium(BackendExtracao):
+    nome = "pypdfium2"
+    modulo = pacote = "pypdfium2"
+
+    @staticmethod
+    def _abrir(fonte_pdf):
+        import pypdfium2
+
+        # O pdfium lê o ficheiro diretamente; só aceita bytes como buffer.
+        if _e_buffer(fonte_pdf) and not isinstance(fonte_pdf, bytes):
+            fonte_pdf = bytes(fonte_pdf)
+        return pypdfium2.PdfDocument(fonte_pdf)
+
+    def contar_paginas(self, fonte_pdf):
+        documento = self._abrir(fonte_pdf)
+        try:
+            return len(documento)
+        finally:
+            documento.close()
+
+    def iterar_paginas(self, fonte_pdf, inicio=0, fim=None):
+        documento = self._abrir(fonte_pdf)
+        try:
+            for indice in range(inicio, len(documento) if fim is None else fim):
+                pagina = documento[indice]
+                yield indice, pagina.get_textpage().get_text_range()
+                pagina.close()
+        finally:
+            documento.close()
+
+
+class BackendPdfminer(BackendExtracao):
+    nome = "pdfminer"
+    modulo = "pdfminer"
+    pacote = "pdfminer.six"
+
+    def contar_paginas(self, fonte_pdf):
+        from pdfminer.pdfpage import PDFPage
+
+        with abrir_fonte_pdf(fonte_pdf) as fonte:
+            return sum(1 for _ in PDFPage.get_pages(fonte))
+
+    def iterar_paginas(self, fonte_pdf, inicio=0, fim=None):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        gestor = PDFResourceManager(caching=True)
+        with abrir_fonte_pdf(fonte_pdf) as fonte:
+            for indice, pagina in enumerate(PDFPage.get_pages(fonte)):
+                if fim is not None and indice >= fim:
+                    break
+                if indice < inicio:
+                    continue
+                saida = io.StringIO()
+                with TextConverter(gestor, saida, laparams=LAParams()) as conversor:
+                    PDFPageInterpreter(gestor, conversor).process_page(pagina)
+                yield indice, saida.getvalue()
+
+
+BACKENDS_EXTRACAO = {
+    backend.nome: backend for backend in (BackendPyPDF2, BackendPdfium, BackendPdfminer)
+}
+
+BACKEND_PADRAO = os.environ.get("QUIMIJUNO_BACKEND", BackendPyPDF2.nome)
+
+
+def obter_backend(backend=None):
+    """Devolve uma instância do motor pedido (nome ou instância); por omissão BACKEND_PADRAO."""
+    if isinstance(backend, BackendExtracao):
+        return backend
+    nome = backend or BACKEND_PADRAO
+    if nome not in BACKENDS_EXTRACAO:
+        raise ValueError(f"Motor de extração desconhecido: {nome}")
+    if not BACKENDS_EXTRACAO[nome].disponivel():
+        raise ValueError(f"Motor de extração '{nome}' não está instalado.")
+    return BACKENDS_EXTRACAO[nome]()
+
+
+def backends_disponiveis():
+    return [nome for nome, backend in BACKENDS_EXTRACAO.items() if backend.disponivel()]
+
+
+def iterar_paginas_pdf(fonte_pdf, backend=None):
+    """
+    Gera o texto do PDF página a página, como pares (índice, texto).
+    Cada página só é descodificada quando pedida, por isso quem consome
+    pode começar a processar a primeira enquanto as seguintes ainda não
+    foram lidas. Páginas sem texto extraível dão uma string vazia.
+    """
+    yield from obter_backend(backend).iterar_paginas(fonte_pdf)
+
+
+# Abaixo deste número de páginas o arranque dos processos custa mais do que
+# a extração em série, por isso o modo paralelo não é usado.
+PAGINAS_MINIMAS_PARALELO = 20
+
+
+def _extrair_intervalo_paginas(caminho_pdf, inicio, fim, nome_backend):
+    """Extrai o texto das páginas [inicio, fim) com um leitor próprio do processo."""
+    backend = obter_backend(nome_backend)
+    return [texto for _, texto in backend.iterar_paginas(caminho_pdf, inicio, fim)]
+
+
+def iterar_paginas_pdf_paralelo(fonte_pdf, trabalhadores=None, paginas_minimas=PAGINAS_MINIMAS_PARALELO, backend=None):
+    """
+    Igual a iterar_paginas_pdf, mas reparte as páginas por um ProcessPoolExecutor.
+    Cada processo abre o seu próprio leitor sobre o mesmo ficheiro e extrai
+    um bloco contíguo de páginas; os blocos são devolvidos pela ordem original.
+    Com poucos trabalhadores, PDFs pequenos ou fontes em memória (que teriam de
+    ser copiadas para cada processo) recorre à extração em série.
+    """
+    backend = obter_backend(backend)
+    trabalhadores = trabalhadores or os.cpu_count() or 1
+    if trabalhadores < 2 or _e_buffer(fonte_pdf):
+        yield from backend.iterar_paginas(fonte_pdf)
+        return
+
+    total_paginas = backend.contar_paginas(fonte_pdf)
+    if total_paginas < paginas_minimas:
+        yield from backend.iterar_paginas(fonte_pdf)
+        return
+
+    # Blocos mais pequenos do que total/trabalhadores para equilibrar a carga
+    # quando algumas páginas são muito mais pesadas do que outras.
+    tamanho_bloco = max(1, -(-total_paginas // (trabalhadores * 4)))
+    inicios = range(0, total_paginas, tamanho_bloco)
+    fins = [min(inicio + tamanho_bloco, total_paginas) for inicio in inicios]
+
+    with ProcessPoolExecutor(max_workers=min(trabalhadores, len(fins))) as executor:
+        blocos = executor.map(
+            _extrair_intervalo_paginas,
+            [fonte_pdf] * len(fins), inicios, fins, [backend.nome] * len(fins),
+        )
+        for inicio, textos in zip(inicios, blocos):
+            for deslocamento, texto in enumerate(textos):
+                yield inicio + deslocamento, texto
+
+
+CABECALHO_TABELA = "DESCRIÇÃO"
+
+# Linhas que indicam que a tabela de produtos terminou (totais/rodapé).
+MARCADOR_FIM_TABELA = re.compile(
+    r"^\s*(?:Total\s+(?:Il[ií]quido|L[ií]quido|s/\s*IVA|Geral|da\s+Cota[cç][aã]o)|Sub-?total)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def filtrar_regiao_tabela(paginas, cabecalho=CABECALHO_TABELA, marcador_fim=MARCADOR_FIM_TABELA,
+                          antes_tabela=None):
+    """
+    Filtra um iterador de páginas (índice, texto) para a região da tabela:
+    ignora as páginas antes da que contém o cabeçalho e pára depois da
+    página onde aparece o marcador de fim. As páginas seguintes (anexos,
+    condições gerais, fichas de segurança) nunca chegam a ser pedidas.
+    antes_tabela(indice, texto), se indicada, recebe cada página ignorada
+    antes do cabeçalho (a carta de apresentação, com o número e a data).
+    """
+    antes_tabela = antes_tabela or _ignorar
+    dentro_tabela = False
+    for indice, texto in paginas:
+        if not dentro_tabela:
+            posicao = texto.find(cabecalho)
+            if posicao < 0:
+                antes_tabela(indice, texto)
+                continue
+            dentro_tabela = True
+            resto = texto[posicao + len(cabecalho):]
+        else:
+            resto = texto
+        yield indice, texto
+        if marcador_fim is not None and marcador_fim.search(resto):
+            return
+
+
+def iterar_paginas_tabela(fonte_pdf, backend=None, cabecalho=CABECALHO_TABELA, marcador_fim=MARCADOR_FIM_TABELA,
+                          antes_tabela=None):
+    """
+    Extração preguiçosa limitada à tabela de produtos: as páginas são
+    descodificadas uma a uma e a leitura termina no marcador de fim.
+    antes_tabela é passada a filtrar_regiao_tabela.
+    """
+    paginas = obter_backend(backend).iterar_paginas(fonte_pdf)
+    try:
+        yield from filtrar_regiao_tabela(paginas, cabecalho, marcador_fim, antes_tabela)
+    finally:
+        paginas.close()
+
+
+TAMANHO_MAXIMO_CACHE = 256 * 1024 * 1024  # bytes de texto guardado
+
+
+def calcular_hash_pdf(fonte_pdf):
+    """Calcula o SHA-256 do conteúdo do PDF (caminho ou buffer em memória)."""
+    if _e_buffer(fonte_pdf):
+        return hashlib.sha256(fonte_pdf).hexdigest()
+    with abrir_fonte_pdf(fonte_pdf) as fonte:
+        if isinstance(fonte, mmap.mmap):
+            return hashlib.sha256(fonte).hexdigest()
+        return hashlib.sha256(fonte.read()).hexdigest()
+
+
+def diretorio_cache():
+    """Devolve a pasta de cache do utilizador para a aplicação."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "quimijuno")
+
+
+# Páginas de um documento ainda a ser guardado ficam sob uma chave provisória
+# "pendente:<hora>:<id>:<chave>"; as de leituras interrompidas sem limpeza
+# (processo terminado) são apagadas passado este tempo.
+PREFIXO_PENDENTE = "pendente:"
+SEGUNDOS_PENDENTE = 24 * 60 * 60
+
+
+class CacheTextoPDF:
+    """
+    Cache persistente (SQLite) do texto extraído, página a página.
+    A chave é o SHA-256 do PDF mais a versão do extrator. Quando o texto
+    guardado ultrapassa tamanho_maximo, os documentos usados há mais tempo
+    são removidos (LRU). Várias instâncias (outra janela, o modo de lote,
+    processos trabalhadores) podem usar o mesmo ficheiro: as escritas são
+    transações curtas e, em modo WAL, a leitura não bloqueia as escritas.
+    """
+
+    def __init__(self, caminho=None, tamanho_maximo=TAMANHO_MAXIMO_CACHE):
+        if caminho is None:
+            os.makedirs(diretorio_cache(), exist_ok=True)
+            caminho = os.path.join(diretorio_cache(), "texto_pdf.sqlite3")
+        self.tamanho_maximo = tamanho_maximo
+        self.ligacao = sqlite3.connect(caminho)
+        try:
+            self.ligacao.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:  # Sistemas de ficheiros sem memória partilhada
+            pass
+        with self.ligacao:
+            self.ligacao.execute(
+                "CREATE TABLE IF NOT EXISTS documentos ("
+                " chave TEXT PRIMARY KEY,"
+                " tamanho INTEGER NOT NULL,"
+                " ultimo_acesso REAL NOT NULL)"
+            )
+            self.ligacao.execute(
+                "CREATE TABLE IF NOT EXISTS paginas ("
+                " chave TEXT NOT NULL,"
+                " indice INTEGER NOT NULL,"
+                " texto TEXT NOT NULL,"
+                " PRIMARY KEY (chave, indice))"
+            )
+
+    @staticmethod
+    def chave(hash_pdf, versao_backend):
+        return f"{hash_pdf}:{versao_backend}"
+
+    def obter(self, chave):
+        """
+        Devolve as páginas como (índice, texto), lidas da base à medida que
+        são percorridas (sem carregar o documento todo), ou None se não
+        estiver em cache ou a base estiver ocupada (sqlite3.OperationalError).
+        """
+        try:
+            with self.ligacao:
+                atualizado = self.ligacao.execute(
+                    "UPDATE documentos SET ultimo_acesso = ? WHERE chave = ?",
+                    (time.time(), chave),
+                ).rowcount
+            if not atualizado:
+                return None
+            return self.ligacao.execute(
+                "SELECT indice, texto FROM paginas WHERE chave = ? ORDER BY indice", (chave,)
+            )
+        except sqlite3.OperationalError:
+            return None
+
+    def guardar(self, chave, paginas):
+        """
+        Guarda as páginas (pares (índice, texto)) à medida que passam e
+        gera-as de novo, sem as juntar em memória. Cada página é confirmada
+        na sua própria transação, sob uma chave provisória, para não
+        bloquear a base durante a extração; só depois da última é que as
+        páginas passam para a chave e o documento é registado, numa
+        transação curta. Se a leitura falhar ou for abandonada, as páginas
+        provisórias são apagadas e nada fica guardado. Se a base estiver
+        ocupada (sqlite3.OperationalError), as páginas continuam a passar,
+        mas o documento não é guardado. Aplica o limite de tamanho.
+        """
+        provisoria = f"{PREFIXO_PENDENTE}{time.time():.0f}:{uuid.uuid4().hex}:{chave}"
+        tamanho = 0
+        gravar = True
+        concluido = False
+        try:
+            for indice, texto in paginas:
+                if gravar:
+                    gravar = self._executar(
+                        "INSERT INTO paginas (chave, indice, texto) VALUES (?, ?, ?)", (provisoria, indice, texto)
+                    )
+                tamanho += len(texto.encode("utf-8"))
+                yield indice, texto
+            concluido = True
+        finally:
+            if gravar and concluido:
+                gravar = self._publicar(provisoria, chave, tamanho)
+            if not (gravar and concluido):
+                self._executar("DELETE FROM paginas WHERE chave = ?", (provisoria,))
+
+    def _executar(self, sql, parametros):
+        """Executa uma escrita na sua própria transação; False se a base estiver ocupada."""
+        try:
+            with self.ligacao:
+                self.ligacao.execute(sql, parametros)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _publicar(self, provisoria, chave, tamanho):
+        try:
+            with self.ligacao:
+                self.ligacao.execute("DELETE FROM paginas WHERE chave = ?", (chave,))
+                self.ligacao.execute("UPDATE paginas SET chave = ? WHERE chave = ?", (chave, provisoria))
+                self.ligacao.execute(
+                    "INSERT OR REPLACE INTO documentos (chave, tamanho, ultimo_acesso) VALUES (?, ?, ?)",
+                    (chave, tamanho, time.time()),
+                )
+                self._remover_excedente()
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _remover_excedente(self):
+        pendentes = self.ligacao.execute(
+            "SELECT DISTINCT chave FROM paginas WHERE chave LIKE ?", (PREFIXO_PENDENTE + "%",)
+        ).fetchall()
+        limite = time.time() - SEGUNDOS_PENDENTE
+        for (pendente,) in pendentes:
+            if float(pendente[len(PREFIXO_PENDENTE):].split(":", 1)[0]) < limite:
+                self.ligacao.execute("DELETE FROM paginas WHERE chave = ?", (pendente,))
+
+        total = self.ligacao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM documentos").fetchone()[0]
+        if total <= self.tamanho_maximo:
+            return
+        antigos = self.ligacao.execute(
+            "SELECT chave, tamanho FROM documentos ORDER BY ultimo_acesso"
+        ).fetchall()
+        # Nunca remove o documento mais recente, mesmo que sozinho exceda o limite.
+        for chave, tamanho in antigos[:-1]:
+            if total <= self.tamanho_maximo:
+                break
+            self.ligacao.execute("DELETE FROM paginas WHERE chave = ?", (chave,))
+            self.ligacao.execute("DELETE FROM documentos WHERE chave = ?", (chave,))
+            total -= tamanho
+
+    def fechar(self):
+        self.ligacao.close()
+
+
+_cache_padrao = None
+
+
+def obter_cache_padrao(avisar=None):
+    """
+    Abre (uma única vez) a cache na pasta do utilizador; None se não for
+    possível, caso em que o motivo é passado a avisar(mensagem) na tentativa
+    que falhou.
+    """
+    global _cache_padrao
+    if _cache_padrao is None:
+        try:
+            _cache_padrao = CacheTextoPDF()
+        except (OSError, sqlite3.Error) as e:
+            _cache_padrao = False
+            (avisar or _ignorar)(f"Cache de texto indisponível. Erro: {e}")
+    return _cache_padrao or None
+
+
+def iterar_paginas_pdf_com_cache(fonte_pdf, cache=None, trabalhadores=None, backend=None):
+    """
+    Devolve as páginas a partir da cache quando o mesmo PDF já foi extraído
+    pelo mesmo motor; caso contrário extrai-as e guarda-as na cache à medida
+    que passam (o documento fica registado no fim da leitura). Em nenhum dos
+    casos o documento inteiro fica em memória.
+    """
+    backend = obter_backend(backend)
+    if cache is None:
+        yield from iterar_paginas_pdf_paralelo(fonte_pdf, trabalhadores, backend=backend)
+        return
+
+    chave = cache.chave(calcular_hash_pdf(fonte_pdf), backend.versao())
+    paginas = cache.obter(chave)
+    if paginas is not None:
+        yield from paginas
+        return
+
+    yield from cache.guardar(chave, iterar_paginas_pdf_paralelo(fonte_pdf, trabalhadores, backend=backend))
+
+
+# Os valores numéricos são guardados como inteiros em vírgula fixa (sem erros
+# de arredondamento nas somas): quantidade em milésimas, preço unitário com 4
+# casas, taxa de IVA com 4 casas (23% -> 2300) e montante em cêntimos.
+CASAS_QUANTIDADE = 3
+CASAS_PRECO = 4
+CASAS_IMPOSTOS = 4
+CASAS_MONTANTE = 2
+_CASAS_POR_ATRIBUTO = {
+    "quantidade": CASAS_QUANTIDADE,
+    "preco": CASAS_PRECO,
+    "impostos": CASAS_IMPOSTOS,
+    "amount": CASAS_MONTANTE,
+}
+
+# Texto à volta dos números capturados ("17308,72 €", "IVA 23%").
+_EM_VOLTA_NUMERO = " \t\r\n\xa0€%IVA"
+_NUMERO_SOLTO = re.compile(r"-?[\d.,]*\d")
+_SEPARADORES = str.maketrans("", "", ".,")
+# _ESCALAS[casas][decimais] = 10 ** (casas - decimais)
+_ESCALAS = [[10 ** (casas - decimais) for decimais in range(casas + 1)] for casas in range(10)]
+
+
+def ler_numero_pt(texto, casas):
+    """
+    Converte um número escrito à portuguesa ("1.234,56", "12,5", "3.5 €",
+    "IVA 23%") num inteiro com o número de casas decimais pedido. O último
+    separador ('.' ou ',') é o decimal e os anteriores são de milhares; o
+    texto à volta do número é ignorado. Casas a mais arredondam a metade
+    para cima (em valor absoluto). Devolve 0 se o texto não tiver dígitos.
+    No caso habitual (vírgula decimal, no máximo casas decimais) é só um
+    rpartition e um int() sobre os dígitos; o resto vai a _ler_numero_solto.
+    """
+    inteira, virgula, fracao = texto.strip(_EM_VOLTA_NUMERO).rpartition(",")
+    decimais = len(fracao) if virgula else 0
+    if decimais <= casas:
+        try:
+            return int(inteira.replace(".", "") + fracao) * _ESCALAS[casas][decimais]
+        except ValueError:
+            pass
+    return _ler_numero_solto(texto, casas)
+
+
+def _ler_numero_solto(texto, casas):
+    numero = _NUMERO_SOLTO.search(texto)
+    if numero is None:
+        return 0
+    numero = numero.group()
+    posicao = max(numero.rfind(","), numero.rfind("."))
+    if posicao < 0:
+        inteira, fracao = numero, ""
+    else:
+        inteira, fracao = numero[:posicao], numero[posicao + 1:]
+    inteiro = int(inteira.translate(_SEPARADORES).lstrip("-") + fracao)
+    decimais = len(fracao)
+    if decimais <= casas:
+        inteiro *= 10 ** (casas - decimais)
+    else:
+        divisor = 10 ** (decimais - casas)
+        inteiro, resto = divmod(inteiro, divisor)
+        if 2 * resto >= divisor:
+            inteiro += 1
+    return -inteiro if numero[0] == "-" else inteiro
+
+
+def valor_decimal(inteiro, casas):
+    """Valor exato (Decimal) de um inteiro em vírgula fixa."""
+    return Decimal(inteiro).scaleb(-casas)
+
+
+def valor_float(inteiro, casas):
+    """Valor em float de um inteiro em vírgula fixa; só para a escrita final (Excel)."""
+    return inteiro / 10 ** casas
+
+
+# Chave de cada campo no dicionário original do produto e atributo correspondente.
+CAMPOS_PRODUTO = (
+    ("REFERÊNCIA", "referencia"),
+    ("DESCRIÇÃO", "descricao"),
+    ("DESCRIÇÃO_SECUNDARIA", "descricao_secundaria"),
+    ("DESCRIÇÃO_TERCIARIA", "descricao_terciaria"),
+    ("QUANTIDADE", "quantidade"),
+    ("UNIDADE", "unidade"),
+    ("PREÇO UNITÁRIO", "preco"),
+    ("IMPOSTOS", "impostos"),
+    ("AMOUNT", "amount"),
+)
+_ATRIBUTO_POR_CHAVE = dict(CAMPOS_PRODUTO)
+
+
+class Produto(Mapping):
+    """
+    Linha de produto com __slots__ (sem dicionário por instância). Continua a
+    comportar-se como o dicionário antigo: produto["PREÇO UNITÁRIO"], .get(),
+    .items() e comparação com dicts funcionam como antes. Os atributos
+    numéricos (produto.preco, ...) são inteiros em vírgula fixa (ver
+    _CASAS_POR_ATRIBUTO); pelas chaves do dicionário são devolvidos como
+    Decimal exato.
+    """
+
+    __slots__ = tuple(atributo for _, atributo in CAMPOS_PRODUTO)
+
+    def __init__(self, referencia, descricao, descricao_secundaria, descricao_terciaria,
+                 quantidade, unidade, preco, impostos, amount):
+        self.referencia = referencia
+        self.descricao = descricao
+        self.descricao_secundaria = descricao_secundaria
+        self.descricao_terciaria = descricao_terciaria
+        self.quantidade = quantidade
+        self.unidade = unidade
+        self.preco = preco
+        self.impostos = impostos
+        self.amount = amount
+
+    def __getitem__(self, chave):
+        try:
+            atributo = _ATRIBUTO_POR_CHAVE[chave]
+        except KeyError:
+            raise KeyError(chave) from None
+        casas = _CASAS_POR_ATRIBUTO.get(atributo)
+        if casas is None:
+            return getattr(self, atributo)
+        return valor_decimal(getattr(self, atributo), casas)
+
+    def __iter__(self):
+        return iter(_ATRIBUTO_POR_CHAVE)
+
+    def __len__(self):
+        return len(CAMPOS_PRODUTO)
+
+    def __reduce__(self):
+        return Produto, tuple(getattr(self, atributo) for _, atributo in CAMPOS_PRODUTO)
+
+    def __repr__(self):
+        return f"Produto({dict(self)!r})"
+
+
+class TabelaProdutos:
+    """
+    Lista de produtos guardada por colunas: os valores numéricos em array('q')
+    (inteiros em vírgula fixa) e as unidades como strings internadas. Indexar
+    ou iterar devolve objetos Produto, por isso pode ser usada onde antes se
+    usava a lista de dicts.
+    """
+
+    __slots__ = (
+        "referencias", "descricoes", "descricoes_secundarias", "descricoes_terciarias",
+        "quantidades", "unidades", "precos", "impostos", "amounts",
+    )
+
+    def __init__(self, produtos=()):
+        self.referencias = []
+        self.descricoes = []
+        self.descricoes_secundarias = []
+        self.descricoes_terciarias = []
+        self.quantidades = array("q")
+        self.unidades = []
+        self.precos = array("q")
+        self.impostos = array("q")
+        self.amounts = array("q")
+        self.extend(produtos)
+
+    def append(self, produto):
+        self.referencias.append(produto.referencia)
+        self.descricoes.append(produto.descricao)
+        self.descricoes_secundarias.append(produto.descricao_secundaria)
+        self.descricoes_terciarias.append(produto.descricao_terciaria)
+        self.quantidades.append(produto.quantidade)
+        self.unidades.append(sys.intern(produto.unidade))
+        self.precos.append(produto.preco)
+        self.impostos.append(produto.impostos)
+        self.amounts.append(produto.amount)
+
+    def extend(self, produtos):
+        for produto in produtos:
+            self.append(produto)
+
+    def _colunas(self):
+        return (
+            self.referencias, self.descricoes, self.descricoes_secundarias, self.descricoes_terciarias,
+            self.quantidades, self.unidades, self.precos, self.impostos, self.amounts,
+        )
+
+    def __len__(self):
+        return len(self.referencias)
+
+    def __getitem__(self, indice):
+        return Produto(*(coluna[indice] for coluna in self._colunas()))
+
+    def __iter__(self):
+        for campos in zip(*self._colunas()):
+            yield Produto(*campos)
+
+    def __eq__(self, outro):
+        if isinstance(outro, TabelaProdutos):
+            return self._colunas() == outro._colunas()
+        return list(self) == list(outro)
+
+    def totais(self):
+        """Soma exata da quantidade e do montante de todos os produtos, como Decimal."""
+        return {
+            "QUANTIDADE": valor_decimal(sum(self.quantidades), CASAS_QUANTIDADE),
+            "AMOUNT": valor_decimal(sum(self.amounts), CASAS_MONTANTE),
+        }
+
+    def __repr__(self):
+        return f"TabelaProdutos({len(self)} produtos)"
+
+
+# Embalagens que separam a descrição terciária (depois de " Equivalente ") e,
+# entre elas, as que separam a secundária quando não há equivalente.
+EMBALAGENS = ("IBC", "Cisterna", "Tambor", "Palete", "Barrica", "Lata", "Jerrican", "TB")
+EMBALAGENS_SEM_EQUIVALENTE = ("IBC", "Cisterna", "Tambor")
+
+
+class DivisorDescricao:
+    """
+    Divide a descrição em principal / secundária / terciária numa só
+    passagem, com uma expressão regular compilada uma vez que encontra o
+    marcador " Equivalente " e as palavras de embalagem (seguidas de espaço,
+    sem distinguir maiúsculas). As listas de embalagens são configuráveis.
+    """
+
+    def __init__(self, embalagens=EMBALAGENS, embalagens_sem_equivalente=EMBALAGENS_SEM_EQUIVALENTE,
+                 marcador="Equivalente"):
+        grupos = (
+            ("ambas", [p for p in embalagens if p in embalagens_sem_equivalente]),
+            ("depois", [p for p in embalagens if p not in embalagens_sem_equivalente]),
+            ("antes", [p for p in embalagens_sem_equivalente if p not in embalagens]),
+        )
+        alternativas = [f" {re.escape(marcador)}(?= )"]
+        for grupo, palavras in grupos:
+            if palavras:
+                alternativas.append(
+                    f"(?P<{grupo}>(?i:{'|'.join(re.escape(palavra) for palavra in palavras)})(?=\\s))"
+                )
+        self.padrao = re.compile("|".join(alternativas))
+
+    def dividir(self, descricao):
+        """Devolve (principal, secundária, terciária) de uma descrição já normalizada."""
+        equivalente = None
+        embalagem = None
+        for marca in self.padrao.finditer(descricao):
+            grupo = marca.lastgroup
+            if equivalente is not None:
+                if grupo in ("ambas", "depois"):
+                    return (
+                        descricao[:equivalente].strip(),
+                        descricao[equivalente:marca.start()].strip(),
+                        descricao[marca.start():].strip(),
+                    )
+            elif grupo is None:
+                equivalente = marca.start()
+            elif grupo in ("ambas", "antes") and embalagem is None:
+                embalagem = marca.start()
+
+        if equivalente is not None:
+            return descricao[:equivalente].strip(), descricao[equivalente:].strip(), ""
+        if embalagem is not None:
+            return descricao[:embalagem].strip(), descricao[embalagem:].strip(), ""
+        return descricao, "", ""
+
+
+def _montar_produto(referencia, descricao, quantidade, unidade, preco, impostos, amount, perfil=None):
+    """
+    Converte os campos capturados (texto tal como aparece no PDF) num
+    Produto: separa a descrição, normaliza a unidade e converte os números,
+    com as palavras de embalagem e o mapa de unidades do perfil (por omissão
+    o PERFIL_PADRAO).
+    """
+    perfil = perfil or PERFIL_PADRAO
+    referencia = referencia.strip('[]')
+    descricao_completa = " ".join(descricao.split())
+
+    descricao_principal, descricao_secundaria, descricao_terciaria = perfil.divisor.dividir(descricao_completa)
+
+    quantidade = ler_numero_pt(quantidade, CASAS_QUANTIDADE)
+    unidade = perfil.normalizar_unidade(unidade)
+    preco = ler_numero_pt(preco, CASAS_PRECO)
+    # Percentagem com 2 casas é a taxa com 4 casas (23% -> 2300 = 0,23)
+    impostos = ler_numero_pt(impostos or "", CASAS_IMPOSTOS - 2)
+    amount = ler_numero_pt(amount, CASAS_MONTANTE)
+
+    return Produto(
+        referencia,
+        descricao_principal,
+        descricao_secundaria,
+        descricao_terciaria,
+        quantidade,
+        sys.intern(unidade),
+        preco,
+        impostos,
+        amount,
+    )
+
+
+# Parte decimal de um número, com separadores de milhares opcionais à
+# portuguesa ("1.234,56") ou um só separador ("12,5", "12.5").
+_DECIMAIS_PT = r"(?:(?:\.\d{3})+,|[.,])\d+"
+
+# Peças do tokenizador. Cada uma é aplicada numa posição fixa e só lê os
+# poucos campos seguintes, por isso nenhum carácter é relido mais do que um
+# número constante de vezes.
+_TOKEN_REFERENCIA = re.compile(r"\[\w+\]")
+_ESPACOS = re.compile(r"\s*")
+_INICIO_QUANTIDADE = re.compile(r"(?<!\d)\d+[.,]\d")
+
+
+UNIDADES_PADRAO = r"[kK][gG]|[lL](?:itros?)?|UN"
+
+
+class PerfilLayout:
+    """
+    Formato de cotação de um fornecedor: cabeçalho da tabela, unidades aceites
+    (e se são obrigatórias), IVA obrigatório ou não, mapa de unidades e
+    palavras de embalagem. Junta num só motor as variantes que antes eram
+    programas separados. A expressão
+    dos valores e o divisor de descrições são compilados uma vez, quando o
+    perfil é criado; os perfis registados em PERFIS_LAYOUT são partilhados.
+    impressao é uma expressão opcional que, se aparecer no início do
+    documento, escolhe este perfil sem mais testes. camadas são perfis mais permissivos
+    que só correm sobre o texto que este deixou por consumir.
+    """
+
+    def __init__(self, nome, cabecalho=CABECALHO_TABELA, unidades=UNIDADES_PADRAO,
+                 unidade_obrigatoria=False, iva_opcional=False,
+                 mapa_unidades=None, prefixos_unidades=(("L", "L"), ("K", "KG")),
+                 embalagens=EMBALAGENS, embalagens_sem_equivalente=EMBALAGENS_SEM_EQUIVALENTE,
+                 impressao=None, camadas=()):
+        self.nome = nome
+        self.cabecalho = cabecalho
+        self.unidade_obrigatoria = unidade_obrigatoria
+        self.iva_opcional = iva_opcional
+        self.mapa_unidades = {"UN": "Unidades"} if mapa_unidades is None else mapa_unidades
+        self.prefixos_unidades = prefixos_unidades
+        self.divisor = DivisorDescricao(embalagens, embalagens_sem_equivalente)
+        self.impressao = re.compile(impressao) if impressao else None
+        self.camadas = tuple(camadas)
+
+        unidade = rf"\s*(?P<unidade>(?:{unidades}))"
+        if not unidade_obrigatoria:
+            unidade = f"(?:{unidade})?"
+        impostos = r"\s+(?P<impostos>IVA\s*\d+%?)"
+        if iva_opcional:
+            impostos = f"(?:{impostos})?"
+        self.resto = re.compile(
+            r"(?P<decimais>" + _DECIMAIS_PT + ")"
+            + unidade
+            + r"\s+(?P<preco>\d+" + _DECIMAIS_PT + ")"
+            + impostos
+            + r"\s+(?P<amount>\d+" + _DECIMAIS_PT + r"\s*€)",
+            flags=re.IGNORECASE
+        )
+
+    def normalizar_unidade(self, unidade):
+        unidade = (unidade or "").upper()
+        if unidade in self.mapa_unidades:
+            return self.mapa_unidades[unidade]
+        for prefixo, normalizada in self.prefixos_unidades:
+            if unidade.startswith(prefixo):
+                return normalizada
+        return unidade
+
+    def __reduce__(self):
+        # Os processos trabalhadores usam a sua própria cópia já compilada.
+        if PERFIS_LAYOUT.get(self.nome) is self:
+            return obter_perfil, (self.nome,)
+        return super().__reduce__()
+
+    def __repr__(self):
+        return f"PerfilLayout({self.nome!r})"
+
+
+PERFIS_LAYOUT = {}
+
+
+def registar_perfil(perfil):
+    """Acrescenta um perfil ao registo (substitui um com o mesmo nome) e devolve-o."""
+    PERFIS_LAYOUT[perfil.nome] = perfil
+    return perfil
+
+
+# "padrao": quimijuno.py / quimijuno_mod_v3.py. O quimijuno_grok.py difere só
+# por não ter o lookahead antes da quantidade, que não muda o que coincide.
+PERFIL_PADRAO = registar_perfil(PerfilLayout("padrao"))
+# Primeiro a forma completa (unidade e IVA presentes), que cobre quase todas as
+# linhas; as formas sem unidade e sem IVA só correm sobre as lacunas. Em
+# documentos limpos custa o mesmo que uma só passagem.
+registar_perfil(PerfilLayout("adaptativo", unidade_obrigatoria=True, camadas=("padrao", "iva_opcional")))
+# quimijuno_fix_impostos.py: linhas sem IVA também são produtos.
+registar_perfil(PerfilLayout("iva_opcional", iva_opcional=True))
+# quimijuno_v2_ok.py: unidade KG/L obrigatória (a descrição também pode
+# continuar noutra linha, como nos outros, porque o padrão usa re.DOTALL).
+registar_perfil(PerfilLayout(
+    "unidade_obrigatoria",
+    unidades=r"[kK][gG]|[lL](?:itros?)?",
+    unidade_obrigatoria=True,
+))
+
+PERFIL_LAYOUT_PADRAO = os.environ.get("QUIMIJUNO_PERFIL", PERFIL_PADRAO.nome)
+
+
+def obter_perfil(perfil=None):
+    """Devolve o perfil pedido (nome ou instância); por omissão PERFIL_LAYOUT_PADRAO."""
+    if isinstance(perfil, PerfilLayout):
+        return perfil
+    nome = perfil or PERFIL_LAYOUT_PADRAO
+    if nome not in PERFIS_LAYOUT:
+        raise ValueError(f"Perfil de cotação desconhecido: {nome}")
+    return PERFIS_LAYOUT[nome]
+
+
+# Caracteres do início do texto usados para escolher o perfil (cerca de uma
+# página de cotação).
+CARACTERES_IMPRESSAO = 4000
+
+
+def detetar_perfil(texto, perfis=None):
+    """
+    Escolhe o perfil de um documento a partir do início do texto (a carta
+    de apresentação, se houver, e a página com o cabeçalho da tabela): só
+    conta o texto até CARACTERES_IMPRESSAO caracteres depois do primeiro
+    cabeçalho de um dos perfis. Um perfil cuja impressao apareça é
+    escolhido logo; senão ganha o que encontra mais produtos depois do
+    cabeçalho. Em empate (incluindo nenhum produto) fica o perfil por
+    omissão, obter_perfil(), e depois o registado primeiro. Só analisa o
+    início da tabela, por isso custa pouco mais do que nada.
+    """
+    perfis = list(PERFIS_LAYOUT.values()) if perfis is None else [obter_perfil(p) for p in perfis]
+    cabecalhos = (texto.find(perfil.cabecalho) for perfil in perfis)
+    texto = texto[:min((posicao for posicao in cabecalhos if posicao >= 0), default=0) + CARACTERES_IMPRESSAO]
+    for perfil in perfis:
+        if perfil.impressao and perfil.impressao.search(texto):
+            return perfil
+
+    melhor, melhor_contagem = obter_perfil(), -1
+    perfis.sort(key=lambda perfil: perfil is not melhor)  # o perfil por omissão é avaliado primeiro
+    for perfil in perfis:
+        tabela = _texto_da_tabela(texto, perfil.cabecalho)
+        if tabela is None:
+            continue
+        contagem = sum(1 for _ in tokenizar_produtos(tabela, perfil))
+        if contagem > melhor_contagem:
+            melhor, melhor_contagem = perfil, contagem
+    return melhor
+
+
+def _proxima_cauda(texto, inicio, resto_produto):
+    """
+    Procura a partir de inicio a primeira posição onde começam os valores do
+    produto (quantidade, unidade, preço, IVA, montante). Devolve
+    (fim_descricao, inicio_quantidade, match_do_resto) ou None.
+    """
+    posicao = inicio
+    while True:
+        quantidade = _INICIO_QUANTIDADE.search(texto, posicao)
+        if quantidade is None:
+            return None
+        separador = quantidade.end() - 2
+        resto = resto_produto.match(texto, separador)
+        if resto:
+            fim_descricao = quantidade.start()
+            while fim_descricao > inicio and texto[fim_descricao - 1].isspace():
+                fim_descricao -= 1
+            return fim_descricao, quantidade.start(), resto
+        posicao = separador + 1
+
+
+def tokenizar_produtos(texto, perfil=None):
+    """
+    Gera os campos de cada produto (referencia, descricao, quantidade,
+    unidade, preco, impostos, amount) com o perfil indicado (por omissão o
+    PERFIL_PADRAO), em camadas se o perfil as tiver.
+    """
+    perfil = perfil or PERFIL_PADRAO
+    if perfil.camadas:
+        encontrados = _tokenizar_em_camadas(texto, perfil)
+    else:
+        encontrados = _tokenizar(texto, perfil)
+    for _, _, campos in encontrados:
+        yield campos
+
+
+def _tokenizar_em_camadas(texto, perfil, tokenizar=None):
+    """
+    Corre primeiro o perfil (estrito) sobre o texto todo e depois cada camada
+    mais permissiva só sobre as lacunas que as anteriores deixaram por
+    consumir e que ainda têm um '['. Devolve a lista de (inicio, fim, campos)
+    pela ordem do texto (com outros elementos no fim do tuplo, se tokenizar
+    os acrescentar).
+    """
+    tokenizar = tokenizar or _tokenizar
+    encontrados = list(tokenizar(texto, perfil))
+    for camada in perfil.camadas:
+        camada = obter_perfil(camada)
+        combinados = []
+        posicao = 0
+        for encontrado in encontrados + [None]:
+            inicio, fim = (len(texto), len(texto)) if encontrado is None else encontrado[:2]
+            if texto.find("[", posicao, inicio) >= 0:
+                combinados.extend(
+                    (posicao + lacuna[0], posicao + lacuna[1]) + lacuna[2:]
+                    for lacuna in tokenizar(texto[posicao:inicio], camada)
+                )
+            if encontrado is not None:
+                combinados.append(encontrado)
+            posicao = fim
+        encontrados = combinados
+    return encontrados
+
+
+def _tokenizar(texto, perfil):
+    """
+    Percorre o texto uma única vez e gera (inicio, fim, campos) de cada
+    produto, como o finditer da expressão regular original dos scripts (a
+    do perfil) os capturaria, mas em tempo linear: os fechos ']', as
+    referências [\\w+] e o início dos valores seguintes são procurados com
+    cursores que só avançam. A equivalência é verificada em
+    tests/test_tokenizador.py.
+    """
+    tokens = [token.start() for token in _TOKEN_REFERENCIA.finditer(texto)]
+    indice_token = 0
+    fecho = -1
+    inicio_descricao = (-1, 0)  # (fecho, posição depois dos espaços)
+    cauda = None
+    posicao = 0
+
+    while True:
+        abertura = texto.find("[", posicao)
+        if abertura < 0:
+            return
+        if fecho <= abertura:
+            fecho = texto.find("]", abertura + 1)
+            if fecho < 0:
+                return
+        if fecho == abertura + 1:  # "[]" não é referência
+            posicao = abertura + 1
+            continue
+
+        if inicio_descricao[0] != fecho:
+            inicio_descricao = (fecho, _ESPACOS.match(texto, fecho + 1).end())
+        inicio = inicio_descricao[1]
+
+        # A descrição não pode atravessar outra referência [\w+].
+        while indice_token < len(tokens) and tokens[indice_token] < inicio:
+            indice_token += 1
+        limite = tokens[indice_token] if indice_token < len(tokens) else len(texto)
+
+        # Entre o início anterior e a cauda encontrada não há outra, por isso
+        # a mesma cauda serve enquanto o início não a ultrapassar.
+        if cauda is None or cauda[0] < inicio:
+            cauda = _proxima_cauda(texto, inicio, perfil.resto)
+            if cauda is None:
+                return
+        fim_descricao, inicio_quantidade, resto = cauda
+        if fim_descricao > limite:
+            posicao = abertura + 1
+            continue
+
+        yield abertura, resto.end(), (
+            texto[abertura:fecho + 1],
+            texto[inicio:fim_descricao],
+            texto[inicio_quantidade:resto.end("decimais")],
+            resto.group("unidade"),
+            resto.group("preco"),
+            resto.group("impostos"),
+            resto.group("amount"),
+        )
+        posicao = resto.end()
+
+
+def _texto_da_tabela(texto, cabecalho=CABECALHO_TABELA):
+    """Devolve o texto depois do cabeçalho, sem linhas vazias, ou None se não houver cabeçalho."""
+    if cabecalho in texto:
+        texto = texto.split(cabecalho, 1)[1]
+    else:
+        return None
+
+    # Limpar espaços extra
+    linhas = [linha.strip() for linha in texto.splitlines() if linha.strip()]
+    return "\n".join(linhas)
+
+
+def extrair_produtos(texto, perfil=None):
+    """
+    Extrai os produtos do texto da cotação com o perfil indicado.
+    Devolve uma lista (vazia se o cabeçalho não existir ou nada coincidir).
+    """
+    perfil = obter_perfil(perfil)
+    texto = _texto_da_tabela(texto, perfil.cabecalho)
+    if texto is None:
+        return TabelaProdutos()
+    return TabelaProdutos(_montar_produto(*campos, perfil) for campos in tokenizar_produtos(texto, perfil))
+
+
+# Abaixo deste tamanho de texto a análise em série é mais rápida do que
+# arrancar processos e enviar-lhes os blocos.
+CARACTERES_MINIMOS_PARALELO = 1_000_000
+TAMANHO_LOTE_ANALISE = 256 * 1024  # caracteres por tarefa enviada a um processo
+
+
+def dividir_por_referencias(texto):
+    """
+    Divide o texto nas referências [\\w+] que iniciam cada linha de produto.
+    Um produto nunca atravessa uma destas referências, exceto quando a sua
+    própria referência ficou por fechar antes dela (por exemplo "[x [R1]");
+    nesses casos não se corta, e o resultado de analisar os blocos
+    separadamente é igual ao de analisar o texto inteiro.
+    """
+    inicio = 0
+    verificado = 0
+    ultima_abertura = ultimo_fecho = -1
+    for token in _TOKEN_REFERENCIA.finditer(texto):
+        corte = token.start()
+        abertura = texto.rfind("[", verificado, corte)
+        fecho = texto.rfind("]", verificado, corte)
+        ultima_abertura = max(ultima_abertura, abertura)
+        ultimo_fecho = max(ultimo_fecho, fecho)
+        verificado = corte
+        if corte > inicio and ultima_abertura <= ultimo_fecho:
+            yield texto[inicio:corte]
+            inicio = corte
+    yield texto[inicio:]
+
+
+def _lotes_de_blocos(blocos, tamanho_lote):
+    """Junta blocos consecutivos em lotes de cerca de tamanho_lote caracteres."""
+    lote = []
+    tamanho = 0
+    for bloco in blocos:
+        lote.append(bloco)
+        tamanho += len(bloco)
+        if tamanho >= tamanho_lote:
+            yield lote
+            lote = []
+            tamanho = 0
+    if lote:
+        yield lote
+
+
+def _analisar_lote(blocos, perfil=None):
+    """Analisa cada bloco de forma independente (corre nos processos trabalhadores)."""
+    return [
+        _montar_produto(*campos, perfil)
+        for bloco in blocos
+        for campos in tokenizar_produtos(bloco, perfil)
+    ]
+
+
+def extrair_produtos_paralelo(texto, trabalhadores=None, tamanho_lote=TAMANHO_LOTE_ANALISE,
+                              caracteres_minimos=CARACTERES_MINIMOS_PARALELO, perfil=None):
+    """
+    Como extrair_produtos, mas divide o texto nas referências e reparte os
+    blocos por um ProcessPoolExecutor. Cada análise corre sobre um bloco
+    pequeno e os resultados voltam pela ordem original. Textos pequenos ou
+    um só trabalhador usam a análise em série.
+    """
+    perfil = obter_perfil(perfil)
+    produtos = TabelaProdutos()
+    texto = _texto_da_tabela(texto, perfil.cabecalho)
+    if texto is None:
+        return produtos
+
+    trabalhadores = trabalhadores or os.cpu_count() or 1
+    lotes = _lotes_de_blocos(dividir_por_referencias(texto), tamanho_lote)
+    if trabalhadores < 2 or len(texto) < caracteres_minimos:
+        for lote in lotes:
+            produtos.extend(_analisar_lote(lote, perfil))
+        return produtos
+
+    with ProcessPoolExecutor(max_workers=trabalhadores) as executor:
+        for lote_analisado in executor.map(_analisar_lote, lotes, repeat(perfil)):
+            produtos.extend(lote_analisado)
+    return produtos
+
+
+class AnalisadorIncremental:
+    """
+    Analisa o texto da cotação aos bocados (tipicamente uma página de cada
+    vez). Cada bocado é tratado como se fosse seguido de uma mudança de linha,
+    tal como em extrair_texto_pdf. Os produtos são devolvidos assim que não
+    podem mudar: tudo o que está antes da última referência [\\w+] onde
+    dividir_por_referencias pode cortar. Só o resto (o produto ainda em curso,
+    que pode continuar na página seguinte) fica guardado, por isso a memória
+    não cresce com o tamanho do documento. O resultado final é igual ao de
+    extrair_produtos sobre o texto completo.
+    """
+
+    def __init__(self, cabecalho=None, perfil=None):
+        self.perfil = obter_perfil(perfil)
+        self.cabecalho = cabecalho or self.perfil.cabecalho
+        self.cabecalho_encontrado = False
+        self.pendente = ""
+        self.tem_texto = False
+
+    def alimentar(self, texto):
+        """Acrescenta um bocado de texto e devolve a lista de produtos já concluídos."""
+        if not self.cabecalho_encontrado:
+            posicao = texto.find(self.cabecalho)
+            if posicao < 0:
+                return []
+            self.cabecalho_encontrado = True
+            texto = texto[posicao + len(self.cabecalho):]
+
+        linhas = [linha.strip() for linha in (texto + "\n").splitlines() if linha.strip()]
+        if not linhas:
+            return []
+        novo = "\n".join(linhas)
+        self.pendente = f"{self.pendente}\n{novo}" if self.tem_texto else novo
+        self.tem_texto = True
+
+        blocos = list(dividir_por_referencias(self.pendente))
+        self.pendente = blocos.pop()
+        return _analisar_lote(blocos, self.perfil)
+
+    def terminar(self):
+        """Analisa o que ficou pendente e devolve os últimos produtos."""
+        pendente, self.pendente = self.pendente, ""
+        return _analisar_lote([pendente], self.perfil)
+
+
+def iterar_produtos_paginas(paginas, cabecalho=None, perfil=None, avisar=None):
+    """
+    Gera os produtos a partir de um iterador de páginas (índice, texto), à
+    medida que as páginas são extraídas, usando o AnalisadorIncremental.
+    No fim, avisar(mensagem) é chamado se faltou o cabeçalho ou se nada
+    coincidiu.
+    """
+    analisador = AnalisadorIncremental(cabecalho, perfil)
+    encontrados = 0
+    for _, texto in paginas:
+        if texto:
+            for produto in analisador.alimentar(texto):
+                encontrados += 1
+                yield produto
+    for produto in analisador.terminar():
+        encontrados += 1
+        yield produto
+
+    avisar = avisar or _ignorar
+    if not analisador.cabecalho_encontrado:
+        avisar(f"Cabeçalho '{analisador.cabecalho}' não encontrado.")
+    elif not encontrados:
+        avisar("Nenhuma entrada de produto foi encontrada com o padrão definido.")
+
+
+def _tokenizar_cronometrado(texto, perfil):
+    """Como _tokenizar, mas acrescenta a cada produto os segundos gastos a encontrá-lo."""
+    encontrados = _tokenizar(texto, perfil)
+    while True:
+        inicio = time.perf_counter()
+        try:
+            encontrado = next(encontrados)
+        except StopIteration:
+            return
+        yield encontrado + (time.perf_counter() - inicio,)
+
+
+# Um troço sem espaços nas pontas e sem mudanças de linha.
+_TROCO_NAO_VAZIO = re.compile(r"\S(?:[^\n]*\S)?")
+
+
+def diagnosticar_produtos(paginas, perfil=None):
+    """
+    Modo de diagnóstico: analisa as páginas (índice, texto) como
+    extrair_dados e devolve, para cada produto, o início e o fim no texto da
+    tabela, a página de origem e o tempo gasto a encontrá-lo; e todos os
+    troços de texto (linha a linha) que nenhum padrão consumiu. Serve para
+    encontrar as linhas que tornam a análise lenta e as que são perdidas sem
+    aviso. Sem perfil, é detetado no início do documento (ver _ler_inicio).
+    """
+    paginas = [(indice, texto) for indice, texto in paginas if texto]
+    if perfil is None:
+        perfil = detetar_perfil(_ler_inicio(paginas, _cabecalhos(perfil))[1])
+    perfil = obter_perfil(perfil)
+
+    # Mesmo texto que _texto_da_tabela, mas a saber onde começa cada página.
+    linhas = []
+    inicios_paginas = []
+    indices_paginas = []
+    tamanho = 0
+    cabecalho_encontrado = False
+    for indice, texto in paginas:
+        if not cabecalho_encontrado:
+            posicao = texto.find(perfil.cabecalho)
+            if posicao < 0:
+                continue
+            cabecalho_encontrado = True
+            texto = texto[posicao + len(perfil.cabecalho):]
+        linhas_pagina = [linha.strip() for linha in (texto + "\n").splitlines() if linha.strip()]
+        if linhas_pagina:
+            inicios_paginas.append(tamanho)
+            indices_paginas.append(indice)
+            linhas.extend(linhas_pagina)
+            tamanho += sum(len(linha) + 1 for linha in linhas_pagina)
+    texto = "\n".join(linhas)
+
+    def pagina(posicao):
+        return indices_paginas[bisect_right(inicios_paginas, posicao) - 1]
+
+    inicio_analise = time.perf_counter()
+    if perfil.camadas:
+        encontrados = _tokenizar_em_camadas(texto, perfil, _tokenizar_cronometrado)
+    else:
+        encontrados = list(_tokenizar_cronometrado(texto, perfil))
+    segundos = time.perf_counter() - inicio_analise
+
+    produtos = []
+    nao_consumidos = []
+    posicao = 0
+    for inicio, fim, campos, segundos_produto in encontrados + [(len(texto), len(texto), None, 0.0)]:
+        for troco in _TROCO_NAO_VAZIO.finditer(texto, posicao, inicio):
+            nao_consumidos.append({
+                "inicio": troco.start(),
+                "fim": troco.end(),
+                "pagina": pagina(troco.start()),
+                "texto": troco.group(),
+            })
+        if campos is not None:
+            produtos.append({
+                "inicio": inicio,
+                "fim": fim,
+                "pagina": pagina(inicio),
+                "segundos": segundos_produto,
+                "referencia": campos[0],
+            })
+        posicao = fim
+
+    return {
+        "perfil": perfil.nome,
+        "cabecalho_encontrado": cabecalho_encontrado,
+        "segundos": segundos,
+        "produtos": produtos,
+        "nao_consumidos": nao_consumidos,
+    }
+
+# Colunas da tabela, pela ordem dos tuplos devolvidos pela extração posicional,
+# com o texto do cabeçalho que marca o início de cada uma.
+COLUNAS_POSICIONAIS = (
+    ("referencia", "REFERÊNCIA"),
+    ("descricao", "DESCRIÇÃO"),
+    ("quantidade", "QUANTIDADE"),
+    ("unidade", "UNIDADE"),
+    ("preco", "PREÇO"),
+    ("impostos", "IMPOSTOS"),
+    ("amount", "AMOUNT"),
+)
+
+TOLERANCIA_LINHA = 2.0  # pontos de diferença em y ainda considerados a mesma linha
+
+_QUANTIDADE_UNIDADE = re.compile(r"(\d+" + _DECIMAIS_PT + r")\s*([kK][gG]|[lL](?:itros?)?|UN)?", re.IGNORECASE)
+_NUMERO = re.compile(r"\d+" + _DECIMAIS_PT)
+
+
+def _descodificar_texto(dados, mapa_fonte):
+    """Descodifica os bytes de um operador Tj/TJ com o mapa de caracteres da fonte (como o PyPDF2)."""
+    if isinstance(dados, str):
+        return dados
+    if mapa_fonte is None:
+        return dados.decode("charmap")
+    _, _, codificacao, mapa_unicode, _ = mapa_fonte
+    if isinstance(codificacao, str):
+        try:
+            texto = dados.decode(codificacao, "surrogatepass")
+        except Exception:
+            texto = dados.decode("utf-16-be" if codificacao == "charmap" else "charmap", "surrogatepass")
+    else:
+        texto = "".join(codificacao.get(byte, chr(byte)) for byte in dados)
+    return "".join(mapa_unicode.get(caracter, caracter) for caracter in texto)
+
+
+def _fragmentos_posicionados(pagina):
+    """
+    Percorre a página com o visitor_operand_before do PyPDF2 e devolve os
+    fragmentos de texto (x, y, texto) na posição onde cada Tj/TJ começa.
+    """
+    fontes = pagina.get("/Resources", {}).get("/Font", {})
+    mapas = {}
+    estado = {"fonte": None, "entrelinha": 0.0}
+    fragmentos = []
+
+    def mapa_da_fonte(nome):
+        if nome not in mapas:
+            mapas[nome] = CACHE_MAPAS_FONTES.obter(nome, 200.0, pagina) if nome in fontes else None
+        return mapas[nome]
+
+    def visitante(operador, operandos, cm, tm):
+        if operador == b"Tf":
+            estado["fonte"] = mapa_da_fonte(operandos[0])
+            return
+        if operador == b"TL":
+            estado["entrelinha"] = float(operandos[0])
+            return
+        if operador == b"TD":
+            estado["entrelinha"] = -float(operandos[1])
+            return
+        if operador not in (b"Tj", b"TJ", b"'", b'"'):
+            return
+
+        x_texto, y_texto = tm[4], tm[5]
+        if operador in (b"'", b'"'):
+            # Estes operadores passam à linha seguinte antes de mostrar o texto.
+            y_texto -= estado["entrelinha"]
+            operandos = operandos[-1:]
+
+        if operador == b"TJ":
+            partes = []
+            for elemento in operandos[0]:
+                if isinstance(elemento, (bytes, str)):
+                    partes.append(_descodificar_texto(elemento, estado["fonte"]))
+                elif float(elemento) < -200:  # Afastamento grande equivale a um espaço
+                    partes.append(" ")
+            texto = "".join(partes)
+        else:
+            texto = _descodificar_texto(operandos[0], estado["fonte"])
+
+        if texto.strip():
+            x = x_texto * cm[0] + y_texto * cm[2] + cm[4]
+            y = x_texto * cm[1] + y_texto * cm[3] + cm[5]
+            fragmentos.append((x, y, texto.strip()))
+
+    pagina.extract_text(visitor_operand_before=visitante)
+    return fragmentos
+
+
+def _agrupar_linhas(fragmentos):
+    """Agrupa os fragmentos em linhas (de cima para baixo), cada uma ordenada por x."""
+    linhas = []
+    for x, y, texto in sorted(fragmentos, key=lambda f: (-f[1], f[0])):
+        if linhas and abs(linhas[-1][0] - y) <= TOLERANCIA_LINHA:
+            linhas[-1][1].append((x, texto))
+        else:
+            linhas.append((y, [(x, texto)]))
+    return [sorted(linha) for _, linha in linhas]
+
+
+def _colunas_do_cabecalho(linha):
+    """Devolve [(x, coluna), ...] se a linha for o cabeçalho da tabela, senão None."""
+    colunas = []
+    for x, texto in linha:
+        texto = texto.upper()
+        for coluna, titulo in COLUNAS_POSICIONAIS:
+            if texto.startswith(titulo):
+                colunas.append((x, coluna))
+                break
+    nomes = {coluna for _, coluna in colunas}
+    if {"referencia", "descricao", "quantidade"} <= nomes:
+        return colunas
+    return None
+
+
+def _celulas_da_linha(linha, colunas):
+    """Distribui os fragmentos pelas colunas; a fronteira entre colunas é o ponto médio dos cabeçalhos."""
+    fronteiras = [
+        ((x_atual + x_seguinte) / 2, coluna)
+        for (x_atual, coluna), (x_seguinte, _) in zip(colunas, colunas[1:] + [(float("inf"), None)])
+    ]
+    celulas = {}
+    for x, texto in linha:
+        for fronteira, coluna in fronteiras:
+            if x < fronteira:
+                celulas[coluna] = f"{celulas[coluna]} {texto}" if coluna in celulas else texto
+                break
+    return celulas
+
+
+def _tuplo_da_linha(celulas):
+    """Converte as células de um produto no tuplo de COLUNAS_POSICIONAIS, ou None se estiver incompleto."""
+    quantidade = _QUANTIDADE_UNIDADE.search(celulas.get("quantidade", ""))
+    preco = _NUMERO.search(celulas.get("preco", ""))
+    amount = _NUMERO.search(celulas.get("amount", ""))
+    if not (quantidade and preco and amount):
+        return None
+    unidade = celulas.get("unidade") or quantidade.group(2) or ""
+    return (
+        celulas["referencia"],
+        celulas.get("descricao", ""),
+        quantidade.group(1),
+        unidade,
+        preco.group(),
+        celulas.get("impostos", ""),
+        amount.group(),
+    )
+
+
+def iterar_linhas_posicionais(fonte_pdf, ao_ler_pagina=None):
+    """
+    Extração posicional: usa as posições x/y do texto para repartir cada linha
+    pelas colunas definidas pelo cabeçalho e gera diretamente os tuplos
+    (referencia, descricao, quantidade, unidade, preco, impostos, amount),
+    sem a expressão regular sobre o documento inteiro. As descrições que
+    continuam na linha (ou página) seguinte são juntadas ao produto.
+    Só funciona com PDFs em que cada célula é um fragmento de texto próprio.
+    ao_ler_pagina(indice) é chamado antes de cada página.
+    """
+    ao_ler_pagina = ao_ler_pagina or _ignorar
+    colunas = None
+    atual = None
+    with abrir_fonte_pdf(fonte_pdf) as fonte:
+        for indice, pagina in enumerate(PdfReader(fonte).pages):
+            ao_ler_pagina(indice)
+            for linha in _agrupar_linhas(_fragmentos_posicionados(pagina)):
+                cabecalho = _colunas_do_cabecalho(linha)
+                if cabecalho:
+                    colunas = cabecalho
+                    continue
+                if colunas is None:
+                    continue
+
+                texto_linha = " ".join(texto for _, texto in linha)
+                if MARCADOR_FIM_TABELA.search(texto_linha):
+                    if atual and _tuplo_da_linha(atual):
+                        yield _tuplo_da_linha(atual)
+                    return
+
+                celulas = _celulas_da_linha(linha, colunas)
+                if celulas.get("referencia", "").startswith("["):
+                    if atual and _tuplo_da_linha(atual):
+                        yield _tuplo_da_linha(atual)
+                    atual = celulas
+                elif atual is None:
+                    continue
+                elif celulas.keys() == {"descricao"}:
+                    atual["descricao"] = f"{atual.get('descricao', '')} {celulas['descricao']}"
+                elif not _tuplo_da_linha(atual):
+                    # Os valores do produto podem vir numa linha abaixo da referência.
+                    for coluna, texto in celulas.items():
+                        atual[coluna] = f"{atual[coluna]} {texto}" if coluna in atual else texto
+                else:
+                    yield _tuplo_da_linha(atual)
+                    atual = None
+
+    if atual and _tuplo_da_linha(atual):
+        yield _tuplo_da_linha(atual)
+
+
+def extrair_produtos_posicionais(fonte_pdf, perfil=None):
+    """Como extrair_produtos, mas a partir da extração posicional do PDF."""
+    perfil = obter_perfil(perfil)
+    return TabelaProdutos(_montar_produto(*linha, perfil) for linha in iterar_linhas_posicionais(fonte_pdf))
+
+
+def _listar_pdfs(caminhos):
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for nome in sorted(os.listdir(caminho)):
+                if nome.lower().endswith(".pdf"):
+                    yield os.path.join(caminho, nome)
+        else:
+            yield caminho
+
+
+def benchmark_extracao(caminhos, nomes_backends=None):
+    """
+    Mede cada motor de extração sobre um conjunto local de PDFs (ficheiros ou
+    pastas). Para cada motor devolve as páginas por segundo e a taxa de
+    reconhecimento: produtos encontrados por extrair_produtos a dividir pelo
+    máximo encontrado por qualquer motor no mesmo ficheiro.
+    """
+    pdfs = list(_listar_pdfs(caminhos))
+    nomes = nomes_backends or backends_disponiveis()
+    resultados = {
+        nome: {"motor": nome, "paginas": 0, "segundos": 0.0, "produtos": {}, "erros": 0}
+        for nome in nomes
+    }
+
+    for pdf in pdfs:
+        for nome in nomes:
+            resultado = resultados[nome]
+            inicio = time.perf_counter()
+            try:
+                textos = [texto for _, texto in obter_backend(nome).iterar_paginas(pdf)]
+            except Exception:
+                resultado["erros"] += 1
+                resultado["produtos"][pdf] = 0
+                continue
+            resultado["segundos"] += time.perf_counter() - inicio
+            resultado["paginas"] += len(textos)
+            texto = "".join(texto + "\n" for texto in textos if texto)
+            resultado["produtos"][pdf] = len(extrair_produtos(texto))
+
+    referencia = sum(
+        max(resultado["produtos"].get(pdf, 0) for resultado in resultados.values())
+        for pdf in pdfs
+    )
+    for resultado in resultados.values():
+        encontrados = sum(resultado.pop("produtos").values())
+        resultado["paginas_por_segundo"] = (
+            resultado["paginas"] / resultado["segundos"] if resultado["segundos"] else 0.0
+        )
+        resultado["reconhecimento"] = encontrados / referencia if referencia else 0.0
+    return list(resultados.values())
+
+
+def extrair_texto_pdf(caminho_pdf, trabalhadores=None, apenas_tabela=False, avisar=None):
+    """Texto de todas as páginas com texto, cada uma terminada por uma mudança de linha."""
+    if apenas_tabela:
+        paginas = iterar_paginas_tabela(caminho_pdf)
+    else:
+        paginas = iterar_paginas_pdf_com_cache(caminho_pdf, obter_cache_padrao(avisar), trabalhadores)
+    return "".join(
+        texto + "\n"
+        for _, texto in paginas
+        if texto  # Garantir que não adicionamos páginas vazias
+    )
+
+
+def _ignorar(*args):
+    pass
+
+
+def extrair_dados(texto, perfil=None, avisar=None, trabalhadores=None):
+    """
+    Extrai os produtos do texto da cotação com o perfil indicado (por omissão
+    detetado a partir do início do texto), repartindo a análise por
+    trabalhadores processos (ver extrair_produtos_paralelo). Os avisos
+    (cabeçalho em falta, nenhum produto) são passados a avisar(mensagem) em
+    vez de mostrados.
+    """
+    avisar = avisar or _ignorar
+    if perfil is None:
+        perfil = detetar_perfil(texto)
+    perfil = obter_perfil(perfil)
+    if perfil.cabecalho not in texto:
+        avisar(f"Cabeçalho '{perfil.cabecalho}' não encontrado.")
+        return TabelaProdutos()
+
+    produtos = extrair_produtos_paralelo(texto, trabalhadores, perfil=perfil)
+
+    if not produtos:
+        avisar("Nenhuma entrada de produto foi encontrada com o padrão definido.")
+
+    return produtos
+
+
+CABECALHOS_EXCEL = ["REFERÊNCIA", "DESCRIÇÃO", "QUANTIDADE", "UNIDADE", "PREÇO UNITÁRIO", "IMPOSTOS", "AMOUNT"]
+FORMATO_NUMERO = "#,##0.00"
+
+
+ESTILO_CABECALHO = "Cabeçalho Cotação"
+ESTILO_NUMERO = "Número Cotação"
+
+
+def registar_estilos(workbook):
+    """
+    Regista no livro os estilos com nome usados na exportação (uma vez por
+    livro). As células referem-se a eles pelo nome, por isso o styles.xml
+    fica com uma entrada por estilo em vez de uma por combinação de objetos.
+    """
+    cabecalho = NamedStyle(name=ESTILO_CABECALHO)
+    cabecalho.font = Font(bold=True)
+    cabecalho.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+    cabecalho.alignment = Alignment(horizontal="center", vertical="center")
+    numero = NamedStyle(name=ESTILO_NUMERO, number_format=FORMATO_NUMERO)
+    for estilo in (cabecalho, numero):
+        if estilo.name not in workbook.named_styles:
+            workbook.add_named_style(estilo)
+
+
+class ModeloLinha:
+    """
+    Linha-modelo para uma folha write_only: uma célula já com o estilo de
+    cada coluna estilizada, criada uma vez e reutilizada em todas as linhas
+    (só o valor muda). As colunas sem estilo recebem o valor diretamente.
+    """
+
+    def __init__(self, sheet, estilos):
+        self.celulas = []
+        for coluna, estilo in estilos.items():
+            cell = WriteOnlyCell(sheet)
+            cell.style = estilo
+            self.celulas.append((coluna - 1, cell))
+
+    def linha(self, valores):
+        linha = list(valores)
+        for indice, cell in self.celulas:
+            if linha[indice] is not None:
+                cell.value = linha[indice]
+                linha[indice] = cell
+        return linha
+
+
+# Colunas (a contar de 1) com números no formato FORMATO_NUMERO.
+COLUNAS_NUMERICAS_EXCEL = (3, 5, 6, 7)
+LARGURA_COLUNA_FIXA = 18
+LARGURA_COLUNA_MAXIMA = 255  # limite do Excel
+
+
+class LargurasColunas:
+    """
+    Largura automática das colunas calculada à medida que as linhas são
+    escritas: guarda o maior comprimento de cada coluna, com os números já
+    formatados como o Excel os mostra, sem percorrer a folha outra vez no fim
+    (nem precisar de a ter em memória).
+    """
+
+    def __init__(self, colunas, numericas=()):
+        self.maximos = [0] * colunas
+        self.numericas = {coluna - 1 for coluna in numericas}
+
+    def observar(self, valores):
+        maximos = self.maximos
+        for indice, valor in enumerate(valores):
+            if valor is None:
+                continue
+            if indice in self.numericas and isinstance(valor, (int, float)):
+                comprimento = len(f"{valor:,.2f}")
+            else:
+                comprimento = len(str(valor))
+            if comprimento > maximos[indice]:
+                maximos[indice] = comprimento
+
+    def larguras(self, margem=2):
+        return [min(maximo + margem, LARGURA_COLUNA_MAXIMA) for maximo in self.maximos]
+
+
+def _linhas_excel(produtos):
+    """
+    Linhas da folha para cada produto, como (valores, linha_do_produto): a
+    linha com os valores e, se existirem, a descrição secundária e a
+    terciária em linhas próprias na coluna da descrição.
+    """
+    for produto in produtos:
+        yield [
+            produto.referencia,
+            produto.descricao,
+            valor_float(produto.quantidade, CASAS_QUANTIDADE),
+            produto.unidade,
+            valor_float(produto.preco, CASAS_PRECO),
+            valor_float(produto.impostos, CASAS_IMPOSTOS),
+            valor_float(produto.amount, CASAS_MONTANTE),
+        ], True
+        secundaria = produto.descricao_secundaria
+        if secundaria:
+            yield [None, secundaria], False
+        terciaria = produto.descricao_terciaria
+        if terciaria:
+            yield [None, terciaria], False
+
+
+def _larguras_antes_das_linhas(linhas, largura_automatica, amostra_larguras):
+    """
+    Para os escritores que gravam as larguras antes das linhas: devolve
+    (larguras, linhas). Com largura automática as larguras vêm das primeiras
+    amostra_larguras linhas (ou de todas, sem amostra), que ficam guardadas e
+    voltam à frente das restantes.
+    """
+    if not largura_automatica:
+        return [LARGURA_COLUNA_FIXA] * len(CABECALHOS_EXCEL), linhas
+    larguras = LargurasColunas(len(CABECALHOS_EXCEL), COLUNAS_NUMERICAS_EXCEL)
+    larguras.observar(CABECALHOS_EXCEL)
+    amostra = list(islice(linhas, amostra_larguras))
+    for valores, _ in amostra:
+        larguras.observar(valores)
+    return larguras.larguras(), chain(amostra, linhas)
+
+
+def escrever_excel(produtos, caminho_excel, largura_automatica=False, amostra_larguras=None):
+    """
+    Escreve os produtos com o openpyxl em modo write_only: cada linha vai
+    para o ficheiro logo que é acrescentada, por isso a memória não cresce
+    com o número de produtos e produtos pode ser um gerador que vai sendo
+    alimentado pela análise. Os estilos são registados com nome uma vez e
+    aplicados através de linhas-modelo. Devolve o número de produtos escritos.
+
+    As colunas têm largura LARGURA_COLUNA_FIXA, ou com largura_automatica a
+    do texto mais comprido. No modo write_only as larguras vão no início da
+    folha, por isso são calculadas sobre as primeiras amostra_larguras linhas
+    (uma estimativa, para folhas enormes) ou, sem amostra, sobre todas, que
+    nesse caso ficam em memória até serem escritas.
+    """
+    workbook = Workbook(write_only=True)
+    registar_estilos(workbook)
+    sheet = workbook.create_sheet()
+
+    larguras, linhas = _larguras_antes_das_linhas(_linhas_excel(produtos), largura_automatica, amostra_larguras)
+    for col, largura in enumerate(larguras, 1):
+        sheet.column_dimensions[chr(64 + col)].width = largura
+
+    cabecalho = ModeloLinha(sheet, dict.fromkeys(range(1, len(CABECALHOS_EXCEL) + 1), ESTILO_CABECALHO))
+    sheet.append(cabecalho.linha(CABECALHOS_EXCEL))
+
+    modelo = ModeloLinha(sheet, dict.fromkeys(COLUNAS_NUMERICAS_EXCEL, ESTILO_NUMERO))
+    escritos = 0
+    for valores, linha_do_produto in linhas:
+        if linha_do_produto:
+            sheet.append(modelo.linha(valores))
+            escritos += 1
+        else:
+            sheet.append(valores)
+
+    workbook.save(caminho_excel)
+    return escritos
+
+
+class EscritorExcel:
+    """
+    Destino da exportação para Excel. Cada subclasse escreve as linhas de
+    _linhas_excel (mesmo cabeçalho, formatos e larguras) com uma biblioteca;
+    converter_pdf usa obter_escritor() em vez de uma biblioteca fixa.
+    """
+
+    nome = ""
+    modulo = ""
+
+    @classmethod
+    def disponivel(cls):
+        return importlib.util.find_spec(cls.modulo) is not None
+
+    def escrever(self, produtos, caminho_excel, largura_automatica=False, amostra_larguras=None):
+        """Escreve os produtos (qualquer iterável) e devolve quantos foram escritos."""
+        raise NotImplementedError
+
+
+class EscritorOpenpyxl(EscritorExcel):
+    nome = modulo = "openpyxl"
+
+    def escrever(self, produtos, caminho_excel, largura_automatica=False, amostra_larguras=None):
+        return escrever_excel(produtos, caminho_excel, largura_automatica, amostra_larguras)
+
+
+class EscritorXlsxWriter(EscritorExcel):
+    """
+    XlsxWriter em modo constant_memory: cada linha é escrita num ficheiro
+    temporário assim que a seguinte começa. As larguras das colunas só são
+    gravadas no fecho, por isso a largura automática é sempre exata (a
+    amostra não é precisa).
+    """
+
+    nome = modulo = "xlsxwriter"
+
+    def escrever(self, produtos, caminho_excel, largura_automatica=False, amostra_larguras=None):
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(caminho_excel, {"constant_memory": True})
+        sheet = workbook.add_worksheet("Sheet")  # o nome que o openpyxl dá à folha
+        cabecalho = workbook.add_format({
+            "bold": True, "pattern": 1, "bg_color": "#4F81BD", "align": "center", "valign": "vcenter",
+        })
+        numero = workbook.add_format({"num_format": FORMATO_NUMERO})
+        numericas = {coluna - 1 for coluna in COLUNAS_NUMERICAS_EXCEL}
+        larguras = LargurasColunas(len(CABECALHOS_EXCEL), COLUNAS_NUMERICAS_EXCEL) if largura_automatica else None
+
+        sheet.write_row(0, 0, CABECALHOS_EXCEL, cabecalho)
+        if larguras:
+            larguras.observar(CABECALHOS_EXCEL)
+
+        linha = 1
+        escritos = 0
+        for valores, linha_do_produto in _linhas_excel(produtos):
+            for coluna, valor in enumerate(valores):
+                if valor is None or valor == "":
+                    continue
+                if coluna in numericas and linha_do_produto:
+                    sheet.write_number(linha, coluna, valor, numero)
+                else:
+                    sheet.write_string(linha, coluna, valor)
+            if larguras:
+                larguras.observar(valores)
+            escritos += linha_do_produto
+            linha += 1
+
+        for coluna, largura in enumerate(
+            larguras.larguras() if larguras else [LARGURA_COLUNA_FIXA] * len(CABECALHOS_EXCEL)
+        ):
+            sheet.set_column(coluna, coluna, largura)
+        workbook.close()
+        return escritos
+
+
+# Partes fixas do .xlsx escrito por EscritorXmlDireto.
+# As partes que listam as folhas são modelos: {folhas} é preenchido no fecho
+# do livro, quando já se sabe quantas folhas foram escritas.
+_TIPOS_CONTEUDO_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml"'
+    ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{folhas}'
+    '<Override PartName="/xl/styles.xml"'
+    ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_TIPO_FOLHA_XML = (
+    '<Override PartName="/xl/worksheets/sheet{numero}.xml"'
+    ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_RELACOES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml"'
+    ' Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_LIVRO_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{folhas}</sheets>'
+    '</workbook>'
+)
+_FOLHA_LIVRO_XML = '<sheet name="{nome}" sheetId="{numero}" r:id="rId{numero}"/>'
+# O rId das folhas é o seu número; os estilos ficam com o rId seguinte.
+_RELACOES_LIVRO_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{folhas}'
+    '<Relationship Id="rId{estilos}" Target="styles.xml"'
+    ' Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+    '</Relationships>'
+)
+_RELACAO_FOLHA_XML = (
+    '<Relationship Id="rId{numero}" Target="worksheets/sheet{numero}.xml"'
+    ' Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+)
+# Estilos partilhados, iguais aos dos outros escritores: s="1" cabeçalho
+# (negrito sobre 4F81BD, centrado), s="2" número com o formato embutido 4
+# (#,##0.00).
+_ESTILOS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF4F81BD"/><bgColor indexed="64"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_INICIO_FOLHA_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+)
+_CARACTERES_INVALIDOS_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+LINHAS_POR_ESCRITA_XML = 1000
+
+
+def _celula_texto_xml(referencia, texto, estilo=""):
+    texto = escape(_CARACTERES_INVALIDOS_XML.sub("", texto))
+    espacos = ' xml:space="preserve"' if texto[:1].isspace() or texto[-1:].isspace() else ""
+    return f'<c r="{referencia}"{estilo} t="inlineStr"><is><t{espacos}>{texto}</t></is></c>'
+
+
+class LivroXmlDireto:
+    """
+    Livro .xlsx escrito sem biblioteca, folha a folha: cada folha é gerada
+    linha a linha diretamente para a sua entrada do zipfile, com texto em
+    linha (sem tabela de strings partilhadas), e só uma está aberta de cada
+    vez. As partes que listam as folhas são escritas no fecho. Não há
+    objetos por célula e a memória é constante. O livro é escrito num
+    ficheiro temporário na mesma pasta, que só substitui caminho_excel
+    quando é publicado; se a escrita falhar (descartar, ou uma exceção
+    dentro do with) o temporário é apagado e o destino fica como estava.
+    """
+
+    def __init__(self, caminho_excel):
+        self.caminho_excel = caminho_excel
+        pasta, nome = os.path.split(os.path.abspath(caminho_excel))
+        self.temporario = os.path.join(pasta, f".{nome}.{uuid.uuid4().hex}.tmp")
+        self.arquivo = zipfile.ZipFile(self.temporario, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        self.folhas = []
+        self.folha = None
+        self.linhas = 0  # Linhas da folha aberta, cabeçalho incluído
+
+    def nova_folha(self, nome, cabecalhos, larguras, numericas):
+        """
+        Fecha a folha aberta e começa outra com o nome (já válido e único) e
+        a linha de cabeçalhos. numericas são os índices (a partir de 0) das
+        colunas com o formato numérico nas linhas de produto.
+        """
+        self._fechar_folha()
+        self.folhas.append(nome)
+        self.folha = self.arquivo.open(f"xl/worksheets/sheet{len(self.folhas)}.xml", "w", force_zip64=True)
+        self.letras = [_letra_coluna(coluna) for coluna in range(len(cabecalhos))]
+        self.numericas = numericas
+
+        self.partes = [_INICIO_FOLHA_XML, "<cols>"]
+        for coluna, largura in enumerate(larguras, 1):
+            self.partes.append(f'<col min="{coluna}" max="{coluna}" width="{largura}" customWidth="1"/>')
+        self.partes.append('</cols><sheetData><row r="1">')
+        for letra, cabecalho in zip(self.letras, cabecalhos):
+            self.partes.append(_celula_texto_xml(f"{letra}1", cabecalho, ' s="1"'))
+        self.partes.append("</row>")
+        self.linhas = 1
+
+    def escrever_linha(self, valores, linha_do_produto):
+        self.linhas += 1
+        numero_linha = self.linhas
+        partes = self.partes
+        partes.append(f'<row r="{numero_linha}">')
+        for coluna, valor in enumerate(valores):
+            if valor is None or valor == "":
+                continue
+            referencia = f"{self.letras[coluna]}{numero_linha}"
+            if coluna in self.numericas and linha_do_produto:
+                # 1958.0 como "1958", como nos outros escritores (volta a ser lido como inteiro).
+                partes.append(f'<c r="{referencia}" s="2"><v>{repr(valor).removesuffix(".0")}</v></c>')
+            else:
+                partes.append(_celula_texto_xml(referencia, valor))
+        partes.append("</row>")
+        if numero_linha % LINHAS_POR_ESCRITA_XML == 0:
+            self.folha.write("".join(partes).encode("utf-8"))
+            self.partes = []
+
+    def _fechar_folha(self):
+        if self.folha is None:
+            return
+        self.partes.append("</sheetData></worksheet>")
+        self.folha.write("".join(self.partes).encode("utf-8"))
+        self.folha.close()
+        self.folha = None
+
+    def terminar(self):
+        """Escreve as partes que listam as folhas e fecha o temporário, sem o publicar."""
+        self._fechar_folha()
+        numeros = range(1, len(self.folhas) + 1)
+        self.arquivo.writestr("[Content_Types].xml", _TIPOS_CONTEUDO_XML.format(
+            folhas="".join(_TIPO_FOLHA_XML.format(numero=numero) for numero in numeros)
+        ))
+        self.arquivo.writestr("_rels/.rels", _RELACOES_XML)
+        self.arquivo.writestr("xl/workbook.xml", _LIVRO_XML.format(folhas="".join(
+            _FOLHA_LIVRO_XML.format(nome=escape(nome, {'"': "&quot;"}), numero=numero)
+            for numero, nome in zip(numeros, self.folhas)
+        )))
+        self.arquivo.writestr("xl/_rels/workbook.xml.rels", _RELACOES_LIVRO_XML.format(
+            folhas="".join(_RELACAO_FOLHA_XML.format(numero=numero) for numero in numeros),
+            estilos=len(self.folhas) + 1,
+        ))
+        self.arquivo.writestr("xl/styles.xml", _ESTILOS_XML)
+        self.arquivo.close()
+
+    def publicar(self):
+        """Substitui caminho_excel pelo livro já terminado."""
+        try:
+            os.replace(self.temporario, self.caminho_excel)
+        except OSError:
+            self.descartar()
+            raise
+
+    def fechar(self):
+        self.terminar()
+        self.publicar()
+
+    def descartar(self):
+        """Abandona o livro (terminado ou não) sem tocar em caminho_excel."""
+        try:
+            if self.folha is not None:
+                self.folha.close()
+                self.folha = None
+            self.arquivo.close()
+        finally:
+            if os.path.exists(self.temporario):
+                os.remove(self.temporario)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *excecao):
+        if tipo is None:
+            self.fechar()
+        else:
+            self.descartar()
+
+
+def _letra_coluna(coluna):
+    """Letra da coluna (a partir de 0) na notação A1: 0 -> A, 26 -> AA."""
+    letras = ""
+    coluna += 1
+    while coluna:
+        coluna, resto = divmod(coluna - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+class EscritorXmlDireto(EscritorExcel):
+    """
+    Escreve o .xlsx sem biblioteca, com um LivroXmlDireto de uma só folha:
+    as partes fixas (incluindo o styles.xml) são constantes e o sheet1.xml é
+    gerado linha a linha diretamente para a entrada do zipfile.
+    """
+
+    nome = "xml"
+    modulo = "zipfile"
+
+    def escrever(self, produtos, caminho_excel, largura_automatica=False, amostra_larguras=None):
+        larguras, linhas = _larguras_antes_das_linhas(_linhas_excel(produtos), largura_automatica, amostra_larguras)
+        numericas = {coluna - 1 for coluna in COLUNAS_NUMERICAS_EXCEL}
+
+        escritos = 0
+        with LivroXmlDireto(caminho_excel) as livro:
+            livro.nova_folha("Sheet", CABECALHOS_EXCEL, larguras, numericas)
+            for valores, linha_do_produto in linhas:
+                livro.escrever_linha(valores, linha_do_produto)
+                escritos += linha_do_produto
+        return escritos
+
+
+# O primeiro instalado é o escritor por omissão: a escrita direta em XML é a
+# mais rápida e não precisa de bibliotecas.
+ESCRITORES_EXCEL = {
+    escritor.nome: escritor for escritor in (EscritorXmlDireto, EscritorXlsxWriter, EscritorOpenpyxl)
+}
+
+# Por omissão o primeiro disponível de ESCRITORES_EXCEL.
+ESCRITOR_PADRAO = os.environ.get("QUIMIJUNO_ESCRITOR")
+
+
+def obter_escritor(escritor=None):
+    """Devolve uma instância do escritor pedido (nome ou instância); por omissão ESCRITOR_PADRAO."""
+    if isinstance(escritor, EscritorExcel):
+        return escritor
+    nome = escritor or ESCRITOR_PADRAO or escritores_disponiveis()[0]
+    if nome not in ESCRITORES_EXCEL:
+        raise ValueError(f"Escritor de Excel desconhecido: {nome}")
+    if not ESCRITORES_EXCEL[nome].disponivel():
+        raise ValueError(f"Escritor de Excel '{nome}' não está instalado.")
+    return ESCRITORES_EXCEL[nome]()
+
+
+def escritores_disponiveis():
+    return [nome for nome, escritor in ESCRITORES_EXCEL.items() if escritor.disponivel()]
+
+
+MODOS_EXTRACAO = ("fluxo", "paralelo", "posicional")
+
+
+PAGINAS_ANTES_TABELA = 3  # páginas lidas, no máximo, à procura do cabeçalho da tabela
+
+
+def _ler_inicio(paginas, cabecalhos):
+    """
+    Lê as páginas com texto até à primeira que tem um dos cabecalhos (a
+    carta de apresentação e a página onde a tabela começa), no máximo
+    PAGINAS_ANTES_TABELA. Devolve (paginas, texto): as páginas com texto em
+    fluxo, com as lidas de novo à frente, e o texto das lidas.
+    """
+    paginas = (pagina for pagina in paginas if pagina[1])  # Páginas sem texto não contam
+    lidas = []
+    for pagina in paginas:
+        lidas.append(pagina)
+        if len(lidas) >= PAGINAS_ANTES_TABELA or any(cabecalho in pagina[1] for cabecalho in cabecalhos):
+            break
+    return chain(lidas, paginas), "".join(texto + "\n" for _, texto in lidas)
+
+
+def _cabecalhos(perfil=None):
+    """Cabeçalhos da tabela do perfil pedido ou, sem perfil, de todos os registados."""
+    if perfil is None:
+        return {perfil.cabecalho for perfil in PERFIS_LAYOUT.values()}
+    return {obter_perfil(perfil).cabecalho}
+
+
+def _com_progresso(paginas, avancar):
+    for pagina in paginas:
+        avancar(pagina[0])
+        yield pagina
+
+
+def _progresso_paginas(caminho_pdf, progresso, inicio, fim, mensagem):
+    """
+    Função avancar(indice) que passa a progresso(percentagem, mensagem) a
+    posição da página indice no PDF, entre as percentagens inicio e fim.
+    Sem progresso, não chega a contar as páginas.
+    """
+    if progresso is _ignorar:
+        return _ignorar
+    total = max(1, obter_backend().contar_paginas(caminho_pdf))
+
+    def avancar(indice):
+        pagina = min(indice + 1, total)
+        progresso(inicio + (fim - inicio) * pagina // total, f"{mensagem} (página {pagina} de {total})")
+
+    return avancar
+
+
+class _PdfAberto:
+    """
+    Um PDF pronto a converter: as páginas em fluxo, o texto do início
+    (inicio, ver _ler_inicio), onde estão o número e a data da cotação, e o
+    perfil (o pedido ou o detetado no início). modo_extracao é um de
+    MODOS_EXTRACAO:
+
+    - "fluxo": as páginas são analisadas à medida que chegam
+      (iterar_produtos_paginas), com a memória limitada a uma página;
+    - "paralelo": o texto do PDF é juntado e a análise é repartida por
+      processos (extrair_produtos_paralelo); usa todos os núcleos, mas guarda
+      o documento inteiro em memória;
+    - "posicional": os produtos vêm da extração posicional
+      (iterar_linhas_posicionais) e as páginas de texto só servem para o
+      perfil, o número e a data da cotação.
+
+    Com apenas_tabela as páginas são descodificadas uma a uma, sem a cache
+    de texto, e a leitura começa no cabeçalho da tabela (do perfil pedido ou
+    CABECALHO_TABELA) e termina no marcador de fim (ver
+    iterar_paginas_tabela): as páginas de anexos nunca são lidas. O texto
+    das primeiras páginas antes do cabeçalho (até PAGINAS_ANTES_TABELA)
+    continua a contar para inicio.
+    avancar(indice) é chamado antes de cada página.
+    """
+
+    def __init__(self, caminho_pdf, perfil=None, modo_extracao="fluxo", apenas_tabela=False, trabalhadores=None,
+                 avisar=None, avancar=None):
+        if modo_extracao not in MODOS_EXTRACAO:
+            raise ValueError(f"Modo de extração desconhecido: {modo_extracao}")
+        self.caminho_pdf = caminho_pdf
+        self.modo_extracao = modo_extracao
+        self.trabalhadores = trabalhadores
+        self.avisar = avisar or _ignorar
+        self.avancar = avancar or _ignorar
+
+        antes_tabela = []
+        if apenas_tabela:
+            cabecalho = CABECALHO_TABELA if perfil is None else obter_perfil(perfil).cabecalho
+
+            def guardar_antes_tabela(indice, texto):
+                if texto and len(antes_tabela) < PAGINAS_ANTES_TABELA:
+                    antes_tabela.append(texto)
+
+            paginas = iterar_paginas_tabela(caminho_pdf, cabecalho=cabecalho, antes_tabela=guardar_antes_tabela)
+        elif modo_extracao == "posicional":
+            # Só as primeiras páginas são lidas, por isso não vale a pena a cache nem os processos.
+            paginas = iterar_paginas_pdf(caminho_pdf)
+        else:
+            paginas = iterar_paginas_pdf_com_cache(caminho_pdf, obter_cache_padrao(self.avisar), trabalhadores)
+        if modo_extracao != "posicional":
+            paginas = _com_progresso(paginas, self.avancar)
+
+        self.paginas, self.inicio = _ler_inicio(paginas, _cabecalhos(perfil))
+        self.inicio = "".join(texto + "\n" for texto in antes_tabela) + self.inicio
+        self.perfil = obter_perfil(detetar_perfil(self.inicio) if perfil is None else perfil)
+
+    def produtos(self):
+        """Gera os produtos do PDF pelo modo de extração pedido."""
+        if self.modo_extracao == "paralelo":
+            texto = "".join(texto + "\n" for _, texto in self.paginas)
+            return iter(extrair_dados(texto, self.perfil, self.avisar, self.trabalhadores))
+        if self.modo_extracao == "posicional":
+            return self._produtos_posicionais()
+        return iterar_produtos_paginas(self.paginas, perfil=self.perfil, avisar=self.avisar)
+
+    def _produtos_posicionais(self):
+        encontrados = 0
+        for linha in iterar_linhas_posicionais(self.caminho_pdf, self.avancar):
+            encontrados += 1
+            yield _montar_produto(*linha, self.perfil)
+        if not encontrados:
+            self.avisar("Nenhuma entrada de produto foi encontrada com a extração posicional.")
+
+
+def converter_pdf(caminho_pdf, caminho_excel, perfil=None, avisar=None, progresso=None, trabalhadores=None,
+                  largura_automatica=False, amostra_larguras=None, escritor=None, modo_extracao="fluxo",
+                  apenas_tabela=False):
+    """
+    Conversão completa PDF -> Excel, sem interface. No modo de extração
+    "fluxo" (o padrão) as páginas são extraídas, analisadas e escritas em
+    fluxo, sem guardar o documento nem a lista de produtos, por isso a
+    memória não depende do tamanho da cotação; modo_extracao e
+    apenas_tabela estão descritos em _PdfAberto. Sem perfil, é detetado no
+    início do documento (ver _ler_inicio).
+    progresso(percentagem, mensagem) é chamado a cada página lida e
+    avisar(mensagem) com cada aviso. O Excel é escrito pelo escritor pedido
+    (por omissão obter_escritor()), com largura_automatica e
+    amostra_larguras. Devolve um dicionário com o número de
+    produtos escritos e a lista de avisos; o Excel só é criado se houver
+    produtos. Os erros são lançados como exceções. Pode correr num processo
+    trabalhador (sem callbacks, os avisos ficam só no resultado).
+    """
+    progresso = progresso or _ignorar
+    avisos = []
+
+    def registar_aviso(mensagem):
+        avisos.append(mensagem)
+        if avisar:
+            avisar(mensagem)
+
+    progresso(0, "A processar PDF...")
+    avancar = _progresso_paginas(caminho_pdf, progresso, 0, 99, "A converter")
+    pdf = _PdfAberto(caminho_pdf, perfil, modo_extracao, apenas_tabela, trabalhadores, registar_aviso, avancar)
+    produtos = pdf.produtos()
+    primeiro = next(produtos, None)
+
+    escritos = 0
+    if primeiro is not None:
+        escritos = obter_escritor(escritor).escrever(
+            chain([primeiro], produtos), caminho_excel, largura_automatica, amostra_larguras
+        )
+        progresso(100, "Conversão concluída com sucesso!")
+
+    return {"caminho_pdf": caminho_pdf, "caminho_excel": caminho_excel, "produtos": escritos, "avisos": avisos}
+
+
+LINHAS_MAXIMAS_EXCEL = 1048576  # limite do Excel por folha
+LINHAS_POR_PRODUTO_EXCEL = 3  # linha do produto e descrições secundária e terciária
+CARACTERES_NOME_FOLHA = 31  # limite do Excel
+_CARACTERES_INVALIDOS_FOLHA = re.compile(r"[\[\]:*?/\\]")
+PADRAO_NUMERO_COTACAO = re.compile(r"Cota[cç][aã]o\s*(?:N\s*[.º°]\s*)?(\d[\w./-]*)", re.IGNORECASE)
+MODOS_LOTE = ("folhas", "unica")
+CABECALHO_FICHEIRO = "FICHEIRO"
+
+
+def numero_cotacao(texto):
+    """Número da cotação no texto ("Cotação N.00015" -> "00015") ou None se não o tiver."""
+    encontrado = PADRAO_NUMERO_COTACAO.search(texto)
+    return encontrado.group(1) if encontrado else None
+
+
+def _nome_folha(nome, usados):
+    """
+    Nome de folha válido no Excel: sem []:*?/\\ nem apóstrofos nas pontas,
+    com até 31 caracteres e diferente dos usados (sem distinguir maiúsculas),
+    com o sufixo " (2)", " (3)"... se repetido. Acrescenta-o a usados.
+    """
+    base = _CARACTERES_INVALIDOS_FOLHA.sub("_", nome).strip("' ") or "Folha"
+    candidato = base[:CARACTERES_NOME_FOLHA].rstrip("' ")
+    repeticao = 1
+    while candidato.lower() in usados:
+        repeticao += 1
+        sufixo = f" ({repeticao})"
+        candidato = base[:CARACTERES_NOME_FOLHA - len(sufixo)].rstrip("' ") + sufixo
+    usados.add(candidato.lower())
+    return candidato
+
+
+class _DestinoLote:
+    """
+    Livros e folhas de uma exportação em lote: continua numa folha nova
+    quando a atual não tem espaço para mais um produto e num livro novo
+    ("nome (2).xlsx", ...) quando o atual chega a folhas_por_livro. Os
+    livros só são publicados todos juntos, em fechar; descartar apaga-os
+    sem tocar nos destinos.
+    """
+
+    def __init__(self, caminho_excel, cabecalhos, linhas_por_folha, folhas_por_livro):
+        self.caminho_excel = caminho_excel
+        self.cabecalhos = cabecalhos
+        self.larguras = [LARGURA_COLUNA_FIXA] * len(cabecalhos)
+        deslocamento = len(cabecalhos) - len(CABECALHOS_EXCEL)
+        self.numericas = {coluna - 1 + deslocamento for coluna in COLUNAS_NUMERICAS_EXCEL}
+        self.linhas_por_folha = linhas_por_folha
+        self.folhas_por_livro = folhas_por_livro
+        self.livro = None
+        self.livros = []
+        self.caminhos = []
+
+    def nova_folha(self, nome):
+        if self.livro is None or (self.folhas_por_livro and len(self.livro.folhas) >= self.folhas_por_livro):
+            self._novo_livro()
+        self.nome = nome
+        self.livro.nova_folha(_nome_folha(nome, self.usados), self.cabecalhos, self.larguras, self.numericas)
+
+    def _novo_livro(self):
+        if self.livro is not None:
+            self.livro.terminar()
+        caminho = self.caminho_excel
+        if self.caminhos:
+            raiz, extensao = os.path.splitext(caminho)
+            caminho = f"{raiz} ({len(self.caminhos) + 1}){extensao}"
+        self.livro = LivroXmlDireto(caminho)
+        self.livros.append(self.livro)
+        self.caminhos.append(caminho)
+        self.usados = set()
+
+    def escrever(self, linhas):
+        """Acrescenta as linhas à folha aberta e devolve o número de produtos escritos."""
+        escritos = 0
+        for valores, linha_do_produto in linhas:
+            if linha_do_produto and self.livro.linhas + LINHAS_POR_PRODUTO_EXCEL > self.linhas_por_folha:
+                self.nova_folha(self.nome)
+            self.livro.escrever_linha(valores, linha_do_produto)
+            escritos += linha_do_produto
+        return escritos
+
+    def fechar(self):
+        if self.livro is not None:
+            self.livro.terminar()
+        for livro in self.livros:
+            livro.publicar()
+
+    def descartar(self):
+        for livro in self.livros:
+            livro.descartar()
+        self.caminhos = []
+
+
+def _pdfs_do_lote(caminhos_pdf, avisos, avisar, progresso, perfil, modo_extracao, apenas_tabela, trabalhadores):
+    """
+    Abre os PDFs de um lote (ficheiros ou pastas) um a um, pela ordem dada,
+    e gera cada um como _PdfAberto, com avisar a guardar em avisos (e a
+    passar a avisar) cada aviso com o nome do ficheiro à frente. progresso
+    é chamado a cada página, com a percentagem do lote todo.
+    """
+    caminhos_pdf = list(_listar_pdfs(caminhos_pdf))
+    for indice, caminho_pdf in enumerate(caminhos_pdf):
+        ficheiro = os.path.basename(caminho_pdf)
+        inicio = 100 * indice // len(caminhos_pdf)
+        progresso(inicio, f"A converter {ficheiro}...")
+        avancar = _progresso_paginas(
+            caminho_pdf, progresso, inicio, 100 * (indice + 1) // len(caminhos_pdf), f"A converter {ficheiro}"
+        )
+
+        def registar_aviso(mensagem, ficheiro=ficheiro):
+            mensagem = f"{ficheiro}: {mensagem}"
+            avisos.append(mensagem)
+            if avisar:
+                avisar(mensagem)
+
+        yield _PdfAberto(caminho_pdf, perfil, modo_extracao, apenas_tabela, trabalhadores, registar_aviso, avancar)
+
+
+def converter_lote(caminhos_pdf, caminho_excel, modo="folhas", perfil=None, avisar=None, progresso=None,
+                   trabalhadores=None, linhas_por_folha=LINHAS_MAXIMAS_EXCEL, folhas_por_livro=None,
+                   modo_extracao="fluxo", apenas_tabela=False):
+    """
+    Junta várias cotações (ficheiros ou pastas com PDFs) num só livro, em
+    fluxo: cada PDF é extraído, analisado e acrescentado antes de abrir o
+    seguinte, por isso a memória não depende do número nem do tamanho das
+    cotações. No modo "folhas" cada cotação fica numa folha com o número da
+    cotação (ou o nome do ficheiro, se não o tiver); no modo "unica" ficam
+    todas na folha "Produtos", com a coluna FICHEIRO a indicar a origem.
+    Uma folha que chegue a linhas_por_folha continua noutra ("Produtos (2)",
+    ...) e, com folhas_por_livro, um livro cheio continua noutro ficheiro.
+    Sem perfil, é detetado em cada PDF; modo_extracao e apenas_tabela
+    estão descritos em _PdfAberto. avisar(mensagem) recebe os avisos
+    com o nome do ficheiro à frente e progresso(percentagem, mensagem) é
+    chamado a cada página. Devolve um dicionário com os livros escritos,
+    o total de produtos, os produtos de cada PDF (pela ordem dada) e a lista
+    de avisos.
+    """
+    if modo not in MODOS_LOTE:
+        raise ValueError(f"Modo de lote desconhecido: {modo}")
+    progresso = progresso or _ignorar
+    avisos = []
+    pdfs = []
+    unica = modo == "unica"
+    cabecalhos = [CABECALHO_FICHEIRO] + CABECALHOS_EXCEL if unica else CABECALHOS_EXCEL
+    destino = _DestinoLote(caminho_excel, cabecalhos, linhas_por_folha, folhas_por_livro)
+
+    try:
+        for pdf in _pdfs_do_lote(
+            caminhos_pdf, avisos, avisar, progresso, perfil, modo_extracao, apenas_tabela, trabalhadores
+        ):
+            produtos = pdf.produtos()
+            primeiro = next(produtos, None)
+            if primeiro is None:
+                pdfs.append({"caminho_pdf": pdf.caminho_pdf, "produtos": 0})
+                continue
+
+            ficheiro = os.path.basename(pdf.caminho_pdf)
+            linhas = _linhas_excel(chain([primeiro], produtos))
+            if unica:
+                if destino.livro is None:
+                    destino.nova_folha("Produtos")
+                linhas = (([ficheiro] + valores, linha_do_produto) for valores, linha_do_produto in linhas)
+            else:
+                destino.nova_folha(numero_cotacao(pdf.inicio) or os.path.splitext(ficheiro)[0])
+            pdfs.append({"caminho_pdf": pdf.caminho_pdf, "produtos": destino.escrever(linhas)})
+    except BaseException:
+        destino.descartar()
+        raise
+    destino.fechar()
+
+    progresso(100, "Conversão concluída com sucesso!")
+    return {
+        "caminhos_excel": destino.caminhos,
+        "produtos": sum(pdf["produtos"] for pdf in pdfs),
+        "pdfs": pdfs,
+        "avisos": avisos,
+    }
+
+
+PADRAO_DATA_COTACAO = re.compile(r"\bData\s*:?\s*(?:(\d{4})-(\d{2})-(\d{2})|(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}))")
+COLUNAS_PARTICAO_PARQUET = ("data_cotacao", "fornecedor")
+PRECISAO_DECIMAL_PARQUET = 19  # cabe qualquer inteiro de 64 bits
+LINHAS_POR_LOTE_PARQUET = 65536
+
+
+def data_cotacao(texto):
+    """Data da cotação no texto ("Data: 2024-03-01" ou "Data: 01/03/2024"), ou None se não a tiver."""
+    for encontrado in PADRAO_DATA_COTACAO.finditer(texto):
+        ano, mes, dia = encontrado.group(1, 2, 3) if encontrado.group(1) else encontrado.group(6, 5, 4)
+        try:
+            return date(int(ano), int(mes), int(dia))
+        except ValueError:  # 31/02/2024 e afins
+            continue
+    return None
+
+
+def _importar_pyarrow():
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ValueError("A exportação para Parquet precisa do pyarrow, que não está instalado.")
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+    return pyarrow
+
+
+def _esquema_parquet(pa, decimais):
+    """
+    Colunas tipadas: os números como decimal128 exato (ou float64, sem
+    decimais) e os textos que se repetem (unidade e os dados da cotação)
+    codificados em dicionário.
+    """
+    def numero(casas):
+        return pa.decimal128(PRECISAO_DECIMAL_PARQUET, casas) if decimais else pa.float64()
+
+    repetido = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("referencia", pa.string()),
+        ("descricao", pa.string()),
+        ("descricao_secundaria", pa.string()),
+        ("descricao_terciaria", pa.string()),
+        ("quantidade", numero(CASAS_QUANTIDADE)),
+        ("unidade", repetido),
+        ("preco", numero(CASAS_PRECO)),
+        ("impostos", numero(CASAS_IMPOSTOS)),
+        ("amount", numero(CASAS_MONTANTE)),
+        ("ficheiro", repetido),
+        ("cotacao", repetido),
+        ("data_cotacao", pa.date32()),
+        ("fornecedor", repetido),
+    ])
+
+
+def _coluna_numerica(pa, inteiros, tipo, casas):
+    """
+    Coluna Arrow de um array('q') em vírgula fixa, sem criar um objeto por
+    valor: para float64 os inteiros são lidos sem cópia e divididos pela
+    escala; para decimal128 já são o valor sem escala e basta estendê-los a
+    128 bits (little-endian: a palavra baixa e depois o sinal).
+    """
+    if not pa.types.is_decimal(tipo):
+        valores = pa.Array.from_buffers(pa.int64(), len(inteiros), [None, pa.py_buffer(inteiros)])
+        return pa.compute.divide(valores.cast(pa.float64(), safe=False), float(10 ** casas))
+    if sys.byteorder != "little":
+        return pa.array([valor_decimal(inteiro, casas) for inteiro in inteiros], tipo)
+    palavras = array("q", bytes(16 * len(inteiros)))
+    palavras[0::2] = inteiros
+    if inteiros and min(inteiros) < 0:
+        palavras[1::2] = array("q", (-(inteiro < 0) for inteiro in inteiros))
+    return pa.Array.from_buffers(tipo, len(inteiros), [None, pa.py_buffer(palavras)])
+
+
+def _coluna_constante(pa, valor, tipo, linhas):
+    if valor is None:
+        return pa.nulls(linhas, tipo)
+    if pa.types.is_dictionary(tipo):
+        indices = pa.repeat(pa.scalar(0, tipo.index_type), linhas)
+        return pa.DictionaryArray.from_arrays(indices, pa.array([valor], tipo.value_type))
+    return pa.repeat(pa.scalar(valor, tipo), linhas)
+
+
+def _lote_arrow(pa, esquema, tabela, cotacao):
+    """RecordBatch com os produtos de uma TabelaProdutos e os dados da cotação repetidos em cada linha."""
+    linhas = len(tabela)
+    colunas = [
+        pa.array(tabela.referencias, pa.string()),
+        pa.array(tabela.descricoes, pa.string()),
+        pa.array([descricao or None for descricao in tabela.descricoes_secundarias], pa.string()),
+        pa.array([descricao or None for descricao in tabela.descricoes_terciarias], pa.string()),
+        _coluna_numerica(pa, tabela.quantidades, esquema.field("quantidade").type, CASAS_QUANTIDADE),
+        pa.array([unidade or None for unidade in tabela.unidades], pa.string()).dictionary_encode(),
+        _coluna_numerica(pa, tabela.precos, esquema.field("preco").type, CASAS_PRECO),
+        _coluna_numerica(pa, tabela.impostos, esquema.field("impostos").type, CASAS_IMPOSTOS),
+        _coluna_numerica(pa, tabela.amounts, esquema.field("amount").type, CASAS_MONTANTE),
+    ]
+    for nome in ("ficheiro", "cotacao", "data_cotacao", "fornecedor"):
+        colunas.append(_coluna_constante(pa, cotacao.get(nome), esquema.field(nome).type, linhas))
+    return pa.RecordBatch.from_arrays(colunas, schema=esquema)
+
+
+def _valor_particao(valor):
+    """Nome da pasta de uma partição hive: o valor codificado como URI (o nulo tem nome próprio)."""
+    if valor is None:
+        return "__HIVE_DEFAULT_PARTITION__"
+    return urllib.parse.quote(str(valor), safe="")
+
+
+def _escrever_arrow(pa, cotacoes, destino, particionar_por, decimais, linhas_por_lote):
+    """
+    Escreve cada (cotacao, produtos) em Parquet, em lotes de até
+    linhas_por_lote produtos de uma só cotação: num ficheiro ou, com
+    particionar_por, numa pasta com partições hive
+    (data_cotacao=2024-03-01/...), em que cada exportação acrescenta um
+    ficheiro novo por partição e as colunas da partição ficam só no nome da
+    pasta. Os lotes são escritos neste fio de execução (a cache de páginas
+    não pode mudar de fio). Devolve o número de produtos escritos.
+    """
+    particionar_por = [particionar_por] if isinstance(particionar_por, str) else list(particionar_por or ())
+    for coluna in particionar_por:
+        if coluna not in COLUNAS_PARTICAO_PARQUET:
+            raise ValueError(f"Coluna de partição desconhecida: {coluna}")
+    esquema = _esquema_parquet(pa, decimais)
+    escritos = 0
+
+    def lotes():
+        nonlocal escritos
+        for cotacao, produtos in cotacoes:
+            produtos = iter(produtos)
+            while True:
+                tabela = TabelaProdutos(islice(produtos, linhas_por_lote))
+                if not tabela:
+                    break
+                escritos += len(tabela)
+                yield cotacao, _lote_arrow(pa, esquema, tabela, cotacao)
+
+    if not particionar_por:
+        with pa.parquet.ParquetWriter(destino, esquema) as escritor:
+            for _, lote in lotes():
+                escritor.write_batch(lote)
+        return escritos
+
+    esquema_ficheiro = pa.schema([campo for campo in esquema if campo.name not in particionar_por])
+    nome_ficheiro = f"{uuid.uuid4().hex}.parquet"
+    escritores = {}
+    try:
+        for cotacao, lote in lotes():
+            chave = tuple(cotacao.get(coluna) for coluna in particionar_por)
+            if chave not in escritores:
+                pasta = os.path.join(destino, *(
+                    f"{coluna}={_valor_particao(valor)}" for coluna, valor in zip(particionar_por, chave)
+                ))
+                os.makedirs(pasta, exist_ok=True)
+                escritores[chave] = pa.parquet.ParquetWriter(os.path.join(pasta, nome_ficheiro), esquema_ficheiro)
+            escritores[chave].write_batch(pa.RecordBatch.from_arrays(
+                [lote.column(nome) for nome in esquema_ficheiro.names], schema=esquema_ficheiro
+            ))
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+    return escritos
+
+
+def escrever_parquet(produtos, caminho_parquet, cotacao=None, particionar_por=None, decimais=True,
+                     linhas_por_lote=LINHAS_POR_LOTE_PARQUET):
+    """
+    Escreve os produtos em Parquet (precisa do pyarrow), em lotes e sem
+    guardar a lista toda, com colunas tipadas: os números como decimal128
+    exato (ou float64 com decimais=False) e a unidade codificada em
+    dicionário. cotacao é um dicionário opcional com ficheiro, cotacao,
+    data_cotacao (date) e fornecedor, repetidos em cada linha. Com
+    particionar_por ("data_cotacao", "fornecedor" ou ambos) caminho_parquet
+    é uma pasta com partições hive. Devolve o número de produtos escritos.
+    """
+    return _escrever_arrow(
+        _importar_pyarrow(), [(cotacao or {}, produtos)], caminho_parquet, particionar_por, decimais, linhas_por_lote
+    )
+
+
+def _contar_produtos(produtos, contagem):
+    for produto in produtos:
+        contagem["produtos"] += 1
+        yield produto
+
+
+def converter_lote_parquet(caminhos_pdf, destino, particionar_por=None, fornecedor=None, decimais=True, perfil=None,
+                           avisar=None, progresso=None, trabalhadores=None, modo_extracao="fluxo",
+                           apenas_tabela=False):
+    """
+    Como converter_lote, mas para Parquet (ver escrever_parquet): os PDFs
+    são lidos um a um e os produtos de todos ficam no mesmo ficheiro (ou na
+    mesma pasta, com particionar_por), com o ficheiro de origem, o número e
+    a data da cotação (procurada no início do PDF, antes de qualquer
+    produto ser escrito, para que todas as linhas a tenham) e o fornecedor
+    em cada linha. fornecedor é um texto para todo o lote ou uma função que o
+    devolve a partir do caminho do PDF; modo_extracao e apenas_tabela estão
+    descritos em _PdfAberto. Devolve um dicionário com o destino,
+    o total de produtos, os produtos de cada PDF e a lista de avisos.
+    """
+    pa = _importar_pyarrow()
+    progresso = progresso or _ignorar
+    avisos = []
+    pdfs = []
+
+    def cotacoes():
+        for pdf in _pdfs_do_lote(
+            caminhos_pdf, avisos, avisar, progresso, perfil, modo_extracao, apenas_tabela, trabalhadores
+        ):
+            cotacao = {
+                "ficheiro": os.path.basename(pdf.caminho_pdf),
+                "cotacao": numero_cotacao(pdf.inicio),
+                "data_cotacao": data_cotacao(pdf.inicio),
+                "fornecedor": fornecedor(pdf.caminho_pdf) if callable(fornecedor) else fornecedor,
+            }
+            contagem = {"caminho_pdf": pdf.caminho_pdf, "produtos": 0}
+            pdfs.append(contagem)
+            yield cotacao, _contar_produtos(pdf.produtos(), contagem)
+
+    escritos = _escrever_arrow(pa, cotacoes(), destino, particionar_por, decimais, LINHAS_POR_LOTE_PARQUET)
+    progresso(100, "Conversão concluída com sucesso!")
+    return {"destino": destino, "produtos": escritos, "pdfs": pdfs, "avisos": avisos}
+
+
+def _pico_memoria():
+    """Pico de memória residente do processo, em bytes, ou None se não houver forma de o medir."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        resource = None
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == "darwin" else pico * 1024
+    if importlib.util.find_spec("psutil") is None:
+        return None
+    import psutil
+
+    return getattr(psutil.Process().memory_info(), "peak_wset", None)
+
+
+def _medir_escritor(nome, produtos, repeticoes, caminho_excel):
+    """Corre num processo novo, para que o pico de memória seja só o deste escritor."""
+    memoria_inicial = _pico_memoria()
+    inicio = time.perf_counter()
+    escritos = obter_escritor(nome).escrever(chain.from_iterable(repeat(produtos, repeticoes)), caminho_excel)
+    segundos = time.perf_counter() - inicio
+    memoria_final = _pico_memoria()
+    return {
+        "escritor": nome,
+        "produtos": escritos,
+        "segundos": segundos,
+        "produtos_por_segundo": escritos / segundos if segundos else 0.0,
+        "pico_memoria": memoria_final,
+        "acrescimo_memoria": memoria_final - memoria_inicial if memoria_final is not None else None,
+    }
+
+
+def benchmark_escrita(caminhos, nomes_escritores=None, repeticoes=1):
+    """
+    Compara os escritores de Excel com os produtos dos PDFs indicados
+    (repetidos repeticoes vezes, para simular exportações grandes). Cada
+    escritor corre num processo próprio; devolve produtos por segundo, o
+    pico de memória residente e o acréscimo durante a escrita.
+    """
+    produtos = TabelaProdutos()
+    for pdf in _listar_pdfs(caminhos):
+        produtos.extend(extrair_dados(extrair_texto_pdf(pdf)))
+
+    resultados = []
+    contexto = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome in nomes_escritores or escritores_disponiveis():
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                resultados.append(executor.submit(
+                    _medir_escritor, nome, produtos, repeticoes, os.path.join(pasta, f"{nome}.xlsx")
+                ).result())
+    return resultados
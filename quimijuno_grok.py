@@ -1,13 +1,12 @@
-import re
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from PyPDF2 import PdfReader
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
 import os
 import sys
 import logging
 
+import quimijuno_core
+
 # Configuração básica de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -92,81 +91,17 @@ class PDFToExcelConverter:
             logging.error(f"Erro ao ler o PDF: {e}")
             raise Exception(f"Não foi possível ler o arquivo PDF: {e}")
 
-    def extrair_dados(self, texto):
-        """Extrai dados do texto usando expressões regulares."""
-        produtos = []
-        if "DESCRIÇÃO" not in texto:
-            logging.warning("Cabeçalho 'DESCRIÇÃO' não encontrado.")
-            messagebox.showwarning("Aviso", "Cabeçalho 'DESCRIÇÃO' não encontrado.")
-            return produtos
-
-        texto = texto.split("DESCRIÇÃO", 1)[1]
-        linhas = [linha.strip() for linha in texto.splitlines() if linha.strip()]
-        texto = "\n".join(linhas)
-
-        padrao = re.compile(
-            r"(?P<referencia>\[[^\]]+\])\s*"
-            r"(?P<descricao>(?:(?!\[\w+\]).)*?)\s*"
-            r"(?P<quantidade>\d+[.,]\d+)"
-            r"(?:\s*(?P<unidade>[kK][gG]|[lL](?:itros?)?|UN))?"
-            r"\s+(?P<preco>\d+[.,]\d+)"
-            r"\s+(?P<impostos>IVA\s*\d+%?)"
-            r"\s+(?P<amount>\d+[.,]\d+\s*€)",
-            flags=re.DOTALL | re.IGNORECASE
-        )
+    def avisar(self, mensagem):
+        logging.warning(mensagem)
+        messagebox.showwarning("Aviso", mensagem)
 
-        for match in padrao.finditer(texto):
-            referencia = match.group("referencia").strip('[]')
-            descricao = " ".join(match.group("descricao").split())
-            quantidade = float(match.group("quantidade").replace(',', '.'))
-            unidade = (match.group("unidade") or "").upper()
-            unidade = {'KG': 'KG', 'LITROS': 'L', 'L': 'L', 'UN': 'Unidades'}.get(unidade[:2], unidade)
-            preco = float(match.group("preco").replace(',', '.'))
-            impostos_text = match.group("impostos")
-            impostos = float(re.search(r'\d+[.,]?\d*', impostos_text).group().replace(',', '.')) / 100.0 if re.search(r'\d+', impostos_text) else 0.0
-            amount = float(match.group("amount").replace('€', '').replace(',', '.').strip())
-
-            produtos.append({
-                "REFERÊNCIA": referencia,
-                "DESCRIÇÃO": descricao,
-                "QUANTIDADE": quantidade,
-                "UNIDADE": unidade,
-                "PREÇO UNITÁRIO": preco,
-                "IMPOSTOS": impostos,
-                "AMOUNT": amount
-            })
-
-        if not produtos:
-            logging.warning("Nenhum produto encontrado no texto.")
-            messagebox.showwarning("Aviso", "Nenhum produto encontrado com o padrão definido.")
-        return produtos
+    def extrair_dados(self, texto):
+        """Extrai os produtos do texto com quimijuno_core.extrair_dados."""
+        return quimijuno_core.extrair_dados(texto, avisar=self.avisar)
 
     def escrever_excel(self, produtos, caminho_excel):
-        """Escreve os dados extraídos em um arquivo Excel."""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Cotação"
-        wb.properties.creator = "Comsoftweb"
-
-        cabecalhos = ["REFERÊNCIA", "DESCRIÇÃO", "QUANTIDADE", "UNIDADE", "PREÇO UNITÁRIO", "IMPOSTOS", "AMOUNT"]
-        header_style = {'font': Font(bold=True, color="FFFFFF"), 'fill': PatternFill(start_color="366092", end_color="366092", fill_type="solid"), 'alignment': Alignment(horizontal="center")}
-
-        # Escreve cabeçalhos
-        ws.append(cabecalhos)
-        for col, cell in enumerate(ws[1], 1):
-            for attr, value in header_style.items():
-                setattr(cell, attr, value)
-
-        # Escreve dados
-        for produto in produtos:
-            ws.append([produto[header] for header in cabecalhos])
-
-        # Ajusta largura das colunas
-        for col in ws.columns:
-            max_length = max(len(str(cell.value or "")) for cell in col) + 2
-            ws.column_dimensions[col[0].column_letter].width = max_length
-
-        wb.save(caminho_excel)
+        """Escreve os dados extraídos em um arquivo Excel com o escritor de quimijuno_core."""
+        quimijuno_core.obter_escritor().escrever(produtos, caminho_excel, largura_automatica=True)
         logging.info(f"Arquivo Excel salvo em: {caminho_excel}")
 
     def convert(self):
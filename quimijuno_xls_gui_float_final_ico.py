@@ -1,12 +1,12 @@
-import re
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PyPDF2 import PdfReader
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
 import os
 import sys  # Import necessário para detectar se estamos a correr no exe do PyInstaller
 
+import quimijuno_core
+from quimijuno_core import iterar_paginas_pdf
+
+
 class PDFToExcelConverter:
     def __init__(self, root):
         """
@@ -79,138 +79,24 @@ class PDFToExcelConverter:
         Extrai todo o texto de um ficheiro PDF, página a página.
         Retorna uma string com o texto completo.
         """
-        texto = ""
-        with open(caminho_pdf, "rb") as f:
-            leitor = PdfReader(f)
-            for pagina in leitor.pages:
-                texto += pagina.extract_text() + "\n"
-        return texto
+        return "".join(texto + "\n" for _, texto in iterar_paginas_pdf(caminho_pdf))
 
     def extrair_dados(self, texto):
         """
-        Extrai os dados de produtos (REFERÊNCIA, DESCRIÇÃO, QUANTIDADE, UNIDADE, PREÇO UNITÁRIO, IMPOSTOS, AMOUNT)
-        usando expressões regulares. Retorna uma lista de dicionários.
+        Extrai os dados de produtos com quimijuno_core.extrair_dados. Os avisos
+        (cabeçalho em falta, nenhum produto) são mostrados numa caixa de diálogo.
         """
-        produtos = []
-        
-        # Verifica se existe o cabeçalho "DESCRIÇÃO" no texto
-        if "DESCRIÇÃO" in texto:
-            texto = texto.split("DESCRIÇÃO", 1)[1]
-        else:
-            messagebox.showwarning("Aviso", "Cabeçalho 'DESCRIÇÃO' não encontrado.")
-            return []
-        
-        # Limpa linhas vazias e junta tudo
-        linhas = [linha.strip() for linha in texto.splitlines() if linha.strip()]
-        texto = "\n".join(linhas)
-        
-        # Expressão regular para capturar os campos
-        padrao = re.compile(
-            r"(?P<referencia>\[[^\]]+\])\s*"
-            r"(?P<descricao>(?:(?!\[\w+\]).)*?)(?=\s*\d+[.,]\d+(?:\s*(?:[kK][gG]|[lL](?:itros?)?|UN))?)\s*"
-            r"(?P<quantidade>\d+[.,]\d+)"
-            r"(?:\s*(?P<unidade>(?:[kK][gG]|[lL](?:itros?)?|UN)))?"
-            r"\s+(?P<preco>\d+[.,]\d+)"
-            r"\s+(?P<impostos>IVA\s*\d+%?)"
-            r"\s+(?P<amount>\d+[.,]\d+\s*€)",
-            flags=re.DOTALL | re.IGNORECASE
+        return quimijuno_core.extrair_dados(
+            texto, avisar=lambda mensagem: messagebox.showwarning("Aviso", mensagem)
         )
-        
-        matches = list(padrao.finditer(texto))
-        
-        if not matches:
-            messagebox.showwarning("Aviso", "Nenhuma entrada de produto foi encontrada com o padrão definido.")
-        
-        for match in matches:
-            referencia = match.group("referencia").strip('[]')
-            descricao = " ".join(match.group("descricao").split())
-            
-            quantidade_str = match.group("quantidade").strip()
-            quantidade = float(quantidade_str.replace(',', '.'))
-            
-            unidade = match.group("unidade")
-            if unidade is None:
-                unidade = ""
-            else:
-                unidade = unidade.upper()
-                if unidade.startswith('L'):
-                    unidade = 'L'
-                elif unidade.startswith('K'):
-                    unidade = 'KG'
-                elif unidade == 'UN':
-                    unidade = 'Unidades'
-            
-            preco_str = match.group("preco").strip()
-            preco = float(preco_str.replace(',', '.'))
-            
-            impostos_text = match.group("impostos")
-            num_impostos = re.search(r'\d+[.,]?\d*', impostos_text)
-            if num_impostos:
-                impostos = float(num_impostos.group().replace(',', '.')) / 100.0
-            else:
-                impostos = 0.0
-            
-            amount_str = match.group("amount").replace('€', '').strip()
-            amount = float(amount_str.replace(',', '.'))
-            
-            produtos.append({
-                "REFERÊNCIA": referencia,
-                "DESCRIÇÃO": descricao,
-                "QUANTIDADE": quantidade,
-                "UNIDADE": unidade,
-                "PREÇO UNITÁRIO": preco,
-                "IMPOSTOS": impostos,
-                "AMOUNT": amount
-            })
-        
-        return produtos
 
     def escrever_excel(self, produtos, caminho_excel):
         """
-        Cria e guarda um ficheiro Excel (caminho_excel) com os dados dos produtos.
+        Cria e guarda um ficheiro Excel (caminho_excel) com os dados dos produtos,
+        com o escritor de quimijuno_core: estilos com nome registados uma vez por
+        livro e larguras das colunas calculadas à medida que as linhas são escritas.
         """
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Cotação"
-        
-        wb.properties.creator = "Comsoftweb"
-
-        
-        # Cabeçalhos para a folha Excel
-        cabecalhos = ["REFERÊNCIA", "DESCRIÇÃO", "QUANTIDADE", "UNIDADE", "PREÇO UNITÁRIO", "IMPOSTOS", "AMOUNT"]
-        
-        # Estilos para o cabeçalho
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Escrever os cabeçalhos
-        for col, header in enumerate(cabecalhos, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Escrever os produtos
-        for row, produto in enumerate(produtos, 2):
-            for col, header in enumerate(cabecalhos, 1):
-                cell = ws.cell(row=row, column=col, value=produto[header])
-                cell.alignment = Alignment(horizontal="center")
-        
-        # Ajustar a largura das colunas
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if cell.value is not None and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Guardar o ficheiro Excel
-        wb.save(caminho_excel)
+        quimijuno_core.obter_escritor().escrever(produtos, caminho_excel, largura_automatica=True)
 
     def convert(self):
         """
@@ -0,0 +1,44 @@
+import random
+
+from quimijuno_core import extrair_produtos, iterar_produtos_paginas
+
+LINHAS = (
+    "[R{n}] Produto quimico {n} 1,00 KG 5,83 IVA 23% 5,83 €",
+    "[R{n}] Produto\nem duas linhas 2,5 Litros 1,0 IVA 6% 2,50 €",
+    "[R{n}] Tambor 200,0 L 1.234,5 UN 2,00 IVA 23% 2.469,00 €",
+    "[R{n}] sem valores",
+    "[x [R{n}] referência por fechar 1,0 KG 2,0 IVA 23% 2,00 €",
+    "Descrição secundária da linha anterior",
+    "",
+)
+
+
+def _texto(aleatorio):
+    linhas = [aleatorio.choice(LINHAS).format(n=n) for n in range(aleatorio.randint(0, 25))]
+    cabecalho = aleatorio.choice(["DESCRIÇÃO QUANTIDADE PREÇO", "sem cabeçalho"])
+    return "Cotação n.º 15\n" + cabecalho + "\n" + "\n".join(linhas)
+
+
+def _paginas(aleatorio, texto):
+    """Corta o texto em páginas em posições aleatórias (também a meio de linhas e de números)."""
+    cortes = sorted(aleatorio.sample(range(len(texto) + 1), aleatorio.randint(0, min(8, len(texto)))))
+    return [texto[inicio:fim] for inicio, fim in zip([0] + cortes, cortes + [len(texto)])]
+
+
+def test_paginas_cortadas_igual_ao_texto_completo():
+    aleatorio = random.Random(20240304)
+    for _ in range(2000):
+        paginas = _paginas(aleatorio, _texto(aleatorio))
+        # Como extrair_texto_pdf: cada página terminada por uma mudança de linha.
+        esperado = list(extrair_produtos("".join(pagina + "\n" for pagina in paginas)))
+        assert list(iterar_produtos_paginas(enumerate(paginas))) == esperado, paginas
+
+
+def test_avisos_no_fim():
+    avisos = []
+    assert list(iterar_produtos_paginas(enumerate(["Cotação", "sem tabela"]), avisar=avisos.append)) == []
+    assert avisos == ["Cabeçalho 'DESCRIÇÃO' não encontrado."]
+
+    avisos.clear()
+    assert list(iterar_produtos_paginas(enumerate(["DESCRIÇÃO", "[R1] sem valores"]), avisar=avisos.append)) == []
+    assert avisos == ["Nenhuma entrada de produto foi encontrada com o padrão definido."]
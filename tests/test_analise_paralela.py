@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from quimijuno_core import dividir_por_referencias, extrair_produtos, extrair_produtos_paralelo
+
+LINHAS = (
+    "[R{n}] Produto quimico {n} 1,00 KG 5,83 IVA 23% 5,83 €",
+    "[R{n}] Produto\nem duas linhas 2,5 Litros 1,0 IVA 6% 2,50 €",
+    "[R{n}] Tambor 200,0 L 1.234,5 UN 2,00 IVA 23% 2.469,00 €",
+    "[R{n}] sem valores",
+    "[x [R{n}] referência por fechar 1,0 KG 2,0 IVA 23% 2,00 €",
+    "[R{n} Embalagem [Y{n}] 3,0 UN 1,5 IVA 13% 4,50 €",
+    "Descrição secundária da linha anterior",
+    "] [ texto solto",
+)
+
+
+def _documento(aleatorio, produtos):
+    linhas = [
+        aleatorio.choice(LINHAS).format(n=n) + aleatorio.choice([" ", "", " \n "])
+        for n in range(produtos)
+    ]
+    return "Cotação n.º 15\nDESCRIÇÃO QUANTIDADE PREÇO\n" + "\n".join(linhas)
+
+
+def test_blocos_reconstituem_o_texto():
+    aleatorio = random.Random(20240302)
+    for _ in range(200):
+        texto = _documento(aleatorio, aleatorio.randint(0, 30))
+        assert "".join(dividir_por_referencias(texto)) == texto
+
+
+def test_blocos_em_serie_igual_ao_texto_inteiro():
+    aleatorio = random.Random(20240303)
+    for _ in range(500):
+        texto = _documento(aleatorio, aleatorio.randint(0, 30))
+        esperado = list(extrair_produtos(texto))
+        obtido = extrair_produtos_paralelo(
+            texto, trabalhadores=1, tamanho_lote=aleatorio.randint(1, 200), caracteres_minimos=0
+        )
+        assert list(obtido) == esperado, texto
+
+
+@pytest.mark.parametrize("tamanho_lote", [1, 64, 4096])
+def test_blocos_em_processos_igual_ao_texto_inteiro(tamanho_lote):
+    texto = _documento(random.Random(tamanho_lote), 300)
+    obtido = extrair_produtos_paralelo(texto, trabalhadores=2, tamanho_lote=tamanho_lote, caracteres_minimos=0)
+    assert list(obtido) == list(extrair_produtos(texto))
@@ -0,0 +1,53 @@
+import pytest
+from openpyxl import load_workbook
+
+from quimijuno_core import CABECALHOS_EXCEL, EscritorOpenpyxl, EscritorXmlDireto, extrair_produtos
+
+TEXTO = (
+    "Cotação n.º 15\nDESCRIÇÃO QUANTIDADE PREÇO\n"
+    "[R1] Produto quimico 1 1,00 KG 5,83 IVA 23% 5,83 €\n"
+    "[R2] Tambor <200> & \"tampa\" 1.234,5 UN 2,0001 IVA 6% 2.469,00 €\n"
+    "[R3] Sem unidade 3,0 1,5 IVA 13% 4,50 €\n"
+)
+
+
+def _ler(caminho):
+    return [list(linha) for linha in load_workbook(caminho).active.iter_rows(values_only=True)]
+
+
+def test_ida_e_volta_pelo_openpyxl(tmp_path):
+    produtos = extrair_produtos(TEXTO)
+    assert EscritorXmlDireto().escrever(produtos, tmp_path / "xml.xlsx", largura_automatica=True) == 3
+    EscritorOpenpyxl().escrever(produtos, tmp_path / "openpyxl.xlsx", largura_automatica=True)
+
+    linhas = _ler(tmp_path / "xml.xlsx")
+    assert linhas == [
+        CABECALHOS_EXCEL,
+        ["R1", "Produto quimico 1", 1, "KG", 5.83, 0.23, 5.83],
+        ["R2", None, 1234.5, "Unidades", 2.0001, 0.06, 2469],
+        [None, 'Tambor <200> & "tampa"', None, None, None, None, None],
+        ["R3", "Sem unidade", 3, None, 1.5, 0.13, 4.5],
+    ]
+    assert linhas == _ler(tmp_path / "openpyxl.xlsx")
+
+
+def _produtos_com_falha():
+    yield extrair_produtos(TEXTO)[0]
+    raise RuntimeError("falha a meio da exportação")
+
+
+def test_falha_nao_deixa_ficheiro(tmp_path):
+    with pytest.raises(RuntimeError):
+        EscritorXmlDireto().escrever(_produtos_com_falha(), tmp_path / "cotacao.xlsx")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_falha_mantem_exportacao_anterior(tmp_path):
+    caminho = tmp_path / "cotacao.xlsx"
+    EscritorXmlDireto().escrever(extrair_produtos(TEXTO), caminho)
+    anterior = caminho.read_bytes()
+
+    with pytest.raises(RuntimeError):
+        EscritorXmlDireto().escrever(_produtos_com_falha(), caminho)
+    assert list(tmp_path.iterdir()) == [caminho]
+    assert caminho.read_bytes() == anterior
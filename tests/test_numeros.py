@@ -0,0 +1,52 @@
+import random
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+from quimijuno_core import ler_numero_pt
+
+
+@pytest.mark.parametrize("texto, casas, esperado", [
+    ("1.234,56", 2, 123456),
+    ("1.234.567,8", 2, 123456780),
+    ("12,5", 2, 1250),
+    ("7", 3, 7000),
+    ("3.5 €", 2, 350),
+    ("17308,72 €", 2, 1730872),
+    ("2,5 Litros", 3, 2500),
+    ("IVA 23%", 0, 23),
+    ("IVA 23%", 4, 230000),
+    ("1,004", 2, 100),
+    ("1,005", 2, 101),
+    ("0,5", 0, 1),
+    ("1.5", 0, 2),
+    (",5", 0, 1),
+    ("-1,005", 2, -101),
+    ("-0,5", 0, -1),
+    ("-1.234,5", 1, -12345),
+    ("", 2, 0),
+    ("sem dígitos", 2, 0),
+])
+def test_casos_conhecidos(texto, casas, esperado):
+    assert ler_numero_pt(texto, casas) == esperado
+
+
+def _portugues(valor):
+    """
+    Escreve o Decimal à portuguesa: '.' nos milhares e ',' nas décimas. Sem
+    décimas não há separadores (o último separador é sempre o decimal).
+    """
+    inteira, _, fracao = f"{abs(valor):,f}".partition(".")
+    texto = inteira.replace(",", ".") + "," + fracao if fracao else inteira.replace(",", "")
+    return "-" + texto if valor < 0 else texto
+
+
+def test_igual_a_decimal_com_arredondamento_a_metade_para_cima():
+    aleatorio = random.Random(20240305)
+    for _ in range(20000):
+        decimais = aleatorio.randint(0, 6)
+        valor = Decimal(aleatorio.randint(-10 ** 10, 10 ** 10)).scaleb(-decimais)
+        casas = aleatorio.randint(0, 4)
+        texto = _portugues(valor) + aleatorio.choice(["", " €", "%", " "])
+        esperado = int(valor.scaleb(casas).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        assert ler_numero_pt(texto, casas) == esperado, (texto, casas)
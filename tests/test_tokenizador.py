@@ -0,0 +1,75 @@
+import random
+import re
+
+import pytest
+
+from quimijuno_core import obter_perfil, tokenizar_produtos
+
+# Expressão regular dos scripts originais (quimijuno.py antes do tokenizador).
+# Não conhece separadores de milhares, por isso o texto gerado não os tem.
+PADRAO_ORIGINAL = re.compile(
+    r"(?P<referencia>\[[^\]]+\])\s*"
+    r"(?P<descricao>(?:(?!\[\w+\]).)*?)(?=\s*\d+[.,]\d+(?:\s*(?:[kK][gG]|[lL](?:itros?)?|UN))?)\s*"
+    r"(?P<quantidade>\d+[.,]\d+)"
+    r"(?:\s*(?P<unidade>(?:[kK][gG]|[lL](?:itros?)?|UN)))?"
+    r"\s+(?P<preco>\d+[.,]\d+)"
+    r"\s+(?P<impostos>IVA\s*\d+%?)"
+    r"\s+(?P<amount>\d+[.,]\d+\s*€)",
+    flags=re.DOTALL | re.IGNORECASE
+)
+CAMPOS = ("referencia", "descricao", "quantidade", "unidade", "preco", "impostos", "amount")
+ESPACOS = (" ", "  ", "\n", "", " \n ")
+
+
+def _original(texto):
+    return [encontrado.group(*CAMPOS) for encontrado in PADRAO_ORIGINAL.finditer(texto)]
+
+
+def _numero(aleatorio):
+    return (
+        aleatorio.choice(["1", "12", "0", "1234", "1.23"])
+        + aleatorio.choice([",", ".", ""])
+        + aleatorio.choice(["5", "50", "", "00"])
+    )
+
+
+def _produto(aleatorio):
+    partes = [
+        aleatorio.choice(["[R1]", "[a-b]", "[X 1]", "[", "[]", "[R2"]),
+        aleatorio.choice(ESPACOS),
+        aleatorio.choice(["Prod", "Prod 2,5", "ABC-3 IBC 1000L", "Tambor 200,0 L", "", "[Y]", "x [Z1] y", "a\nb"]),
+        aleatorio.choice(ESPACOS),
+        _numero(aleatorio),
+        aleatorio.choice(ESPACOS),
+        aleatorio.choice(["KG", "l", "Litros", "litro", "UN", "", "Lx", "kgs"]),
+        aleatorio.choice(ESPACOS),
+        _numero(aleatorio),
+        aleatorio.choice(ESPACOS),
+        aleatorio.choice(["IVA 23%", "IVA23", "iva 6 %", "IVA", "IVA 13%x"]),
+        aleatorio.choice(ESPACOS),
+        _numero(aleatorio),
+        aleatorio.choice([" €", "€", "", " € ", "  €"]),
+    ]
+    if aleatorio.random() < 0.3:
+        partes[aleatorio.randrange(len(partes))] = ""
+    return "".join(partes)
+
+
+@pytest.mark.parametrize("texto", [
+    "[R1] Produto quimico 1,00 KG 5,83 IVA 23% 1609,08 €",
+    "[R1] Produto\nem duas linhas 2,5 Litros 1,0 IVA 6% 2,50 €\n[R2] Outro 3.0 UN 1.5 IVA 23% 4.50 €",
+    "[R1] sem valores [R2] Tambor 200,0 L 1,00 KG 2,00 IVA 23% 2,00 €",
+    "[] [R1 [a-b] x [Z1] y 1,0 2,0 IVA 3,0 €",
+])
+def test_casos_conhecidos(texto):
+    assert list(tokenizar_produtos(texto)) == _original(texto)
+
+
+def test_igual_ao_padrao_original_em_texto_aleatorio():
+    aleatorio = random.Random(20240301)
+    perfil = obter_perfil("padrao")
+    for _ in range(5000):
+        texto = aleatorio.choice(["", "]", "x", "\n"]).join(
+            _produto(aleatorio) for _ in range(aleatorio.randint(1, 5))
+        )
+        assert list(tokenizar_produtos(texto, perfil)) == _original(texto), texto